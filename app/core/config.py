@@ -9,6 +9,10 @@ class Settings(BaseSettings):
     
     MONGODB_URI: str
     MONGODB_DB_NAME: str = "securereport"
+    MONGODB_MAX_POOL_SIZE: int = 100
+    MONGODB_MIN_POOL_SIZE: int = 0
+    MONGODB_MAX_IDLE_TIME_MS: int = 60000
+    MONGODB_WAIT_QUEUE_TIMEOUT_MS: int = 5000
     APP_NAME: str = "SecureReport"
     APP_VERSION: str = "1.0.0"
     DEBUG: bool = True
@@ -16,15 +20,99 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 1440
     
+    # Autenticación: costo de bcrypt, hilos para bcrypt y tokens verificados en caché
+    BCRYPT_ROUNDS: int = 12
+    BCRYPT_MAX_THREADS: int = 4
+    AUTH_TOKEN_CACHE_SIZE: int = 1024
+    
+    # Paginación de reportes
+    REPORTS_PAGE_SIZE: int = 50
+    REPORTS_MAX_PAGE_SIZE: int = 200
+    REPORTS_NEAR_MAX_RADIUS_M: int = 50000
+    REPORTS_EXPORT_BATCH_SIZE: int = 500
+    # El export envía lo acumulado al llegar a este tamaño o a este tiempo
+    REPORTS_EXPORT_FLUSH_BYTES: int = 64 * 1024
+    REPORTS_EXPORT_FLUSH_SECONDS: float = 1.0
+    REPORTS_BULK_MAX_ITEMS: int = 100
+    REPORTS_STATUS_HISTORY_MAX: int = 50
+    
+    # Mapa de calor
+    REPORTS_GEOHASH_PRECISION: int = 8
+    HEATMAP_MAX_CELLS: int = 2000
+    
     # Cloudinary
     CLOUDINARY_CLOUD_NAME: str
     CLOUDINARY_API_KEY: str
     CLOUDINARY_API_SECRET: str
     
+    # Subida de archivos multimedia (bytes). MEDIA_MAX_REQUEST_BYTES debe ser
+    # menor o igual que MEDIA_WORKER_MAX_INFLIGHT_BYTES
+    MEDIA_SPOOL_MAX_MEMORY: int = 1024 * 1024
+    MEDIA_UPLOAD_CHUNK_SIZE: int = 6 * 1024 * 1024
+    MEDIA_MAX_FILE_BYTES: int = 100 * 1024 * 1024
+    MEDIA_MAX_REQUEST_BYTES: int = 200 * 1024 * 1024
+    MEDIA_WORKER_MAX_INFLIGHT_BYTES: int = 512 * 1024 * 1024
+    
+    # Destino de los archivos multimedia: "cloudinary" o "local"
+    MEDIA_STORAGE_BACKEND: str = "cloudinary"
+    MEDIA_LOCAL_DIR: str = "media"
+    MEDIA_LOCAL_BASE_URL: str = "/media"
+    MEDIA_UPLOAD_CONCURRENCY: int = 4
+    # Timeout de cada request HTTP de la subida (una parte de MEDIA_UPLOAD_CHUNK_SIZE),
+    # no del archivo completo: un video grande puede tardar varias veces este valor
+    MEDIA_UPLOAD_PART_TIMEOUT_SECONDS: float = 60.0
+    MEDIA_UPLOAD_RETRIES: int = 2
+    MEDIA_UPLOAD_BACKOFF_SECONDS: float = 0.5
+    
+    # Subida directa a Cloudinary con parámetros firmados. MEDIA_CALLBACK_URL es
+    # la URL pública de POST /api/media/upload/callback (vacía = deshabilitada)
+    MEDIA_CALLBACK_URL: str = ""
+    MEDIA_DIRECT_UPLOAD_TTL_SECONDS: int = 900
+    
+    # Normalización de imágenes (sin metadatos, tamaño máximo, recompresión)
+    MEDIA_IMAGE_NORMALIZE: bool = True
+    MEDIA_IMAGE_MAX_DIMENSION: int = 2048
+    MEDIA_IMAGE_FORMAT: str = "WEBP"  # WEBP o JPEG
+    MEDIA_IMAGE_QUALITY: int = 80
+    # Procesos propios para normalizar imágenes (aparte de WORKER_PROCESSES)
+    MEDIA_IMAGE_WORKER_PROCESSES: int = 2
+    
     # OpenAI
     OPENAI_API_KEY: str
     OPENAI_MODEL: str = "gpt-4-turbo"
     
+    # Chat: recuperación de fragmentos de los PDFs
+    CHAT_CHUNK_MAX_CHARS: int = 1500
+    CHAT_TOP_K: int = 6
+    CHAT_CORPUS_POLL_SECONDS: float = 5.0
+    
+    # Chat: presupuesto de tokens del prompt (CHAT_CONTEXT_MAX_TOKENS es el del contexto)
+    CHAT_CONTEXT_MAX_TOKENS: int = 3000
+    CHAT_PROMPT_MAX_TOKENS: int = 6000
+    CHAT_BUDGET_SYSTEM: int = 1200
+    CHAT_BUDGET_HISTORY: int = 1200
+    CHAT_BUDGET_QUESTION: int = 600
+    
+    # Chat: historial por sesión
+    CHAT_HISTORY_LIMIT: int = 5
+    CHAT_HISTORY_TTL_DAYS: int = 30
+    
+    # Chat: caché de respuestas
+    CHAT_CACHE_MAX_ENTRIES: int = 512
+    CHAT_CACHE_TTL_SECONDS: int = 3600
+    CHAT_CACHE_SHARED: bool = False
+    
+    # Carga de PDFs en segundo plano
+    WORKER_PROCESSES: int = 2
+    INGEST_MAX_JOBS: int = 2
+    INGEST_PAGES_PER_TASK: int = 25
+    INGEST_PAGE_BATCH_SIZE: int = 200
+    INGEST_JOB_TTL_DAYS: int = 7
+    # Una carga en curso renueva updated_at cada INGEST_JOB_HEARTBEAT_SECONDS; sin
+    # renovación por INGEST_JOB_STALE_SECONDS se considera muerta (reinicio/deploy)
+    INGEST_JOB_HEARTBEAT_SECONDS: int = 60
+    INGEST_JOB_STALE_SECONDS: int = 300
+    
     # Admin
     ADMIN_API_KEY: str
 
@@ -0,0 +1,71 @@
+# ARCHIVO: secure-report-back/app/core/geohash.py
+"""Codificación geohash (base32) para agrupar reportes por celdas del mapa"""
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_DECODE = {c: i for i, c in enumerate(_BASE32)}
+
+MAX_PRECISION = 12
+
+# Precisión de geohash recomendada por nivel de zoom de mapas web (0-20).
+# Con estas precisiones una vista completa tiene del orden de cientos de celdas.
+_ZOOM_PRECISION = [1, 1, 1, 2, 2, 3, 3, 4, 4, 5, 5, 5, 6, 6, 7, 7, 7, 8, 8, 8, 8]
+
+
+def encode(lat: float, lng: float, precision: int = 8) -> str:
+    """Calcula el geohash de un punto"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+
+    while len(chars) < precision:
+        rng, value = (lng_range, lng) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            rng[0] = mid
+        else:
+            bits = bits << 1
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits = 0
+            bit_count = 0
+
+    return "".join(chars)
+
+
+def decode_bbox(geohash: str) -> tuple:
+    """Retorna (min_lat, min_lng, max_lat, max_lng) de una celda"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    even = True
+
+    for char in geohash:
+        value = _DECODE[char]
+        for shift in range(4, -1, -1):
+            rng = lng_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if (value >> shift) & 1:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+
+    return lat_range[0], lng_range[0], lat_range[1], lng_range[1]
+
+
+def decode_center(geohash: str) -> tuple:
+    """Retorna (lat, lng) del centro de una celda"""
+    min_lat, min_lng, max_lat, max_lng = decode_bbox(geohash)
+    return (min_lat + max_lat) / 2, (min_lng + max_lng) / 2
+
+
+def precision_for_zoom(zoom: int) -> int:
+    """Precisión de geohash para un nivel de zoom de mapa"""
+    zoom = max(0, min(zoom, len(_ZOOM_PRECISION) - 1))
+    return _ZOOM_PRECISION[zoom]
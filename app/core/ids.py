@@ -0,0 +1,30 @@
+# ARCHIVO: secure-report-back/app/core/ids.py
+"""
+Identificadores ordenables por tiempo (formato ULID).
+
+26 caracteres en base32 de Crockford: 48 bits de milisegundos desde epoch
+seguidos de 80 bits aleatorios. El orden lexicográfico coincide con el orden
+de creación (al milisegundo) y la parte aleatoria hace que dos workers no
+generen el mismo ID en la práctica, sin coordinación entre ellos.
+"""
+
+import secrets
+import time
+
+_CROCKFORD = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+
+
+def _encode(value: int, length: int) -> str:
+    chars = []
+    for _ in range(length):
+        chars.append(_CROCKFORD[value & 31])
+        value >>= 5
+    return "".join(reversed(chars))
+
+
+def new_ulid(timestamp_ms: int = None) -> str:
+    """ULID para el instante actual (o timestamp_ms)"""
+    if timestamp_ms is None:
+        timestamp_ms = time.time_ns() // 1_000_000
+    return _encode(timestamp_ms, 10) + _encode(secrets.randbits(80), 16)
+
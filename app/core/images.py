@@ -0,0 +1,100 @@
+# ARCHIVO: secure-report-back/app/core/images.py
+"""
+Normalización de imágenes antes de subirlas. Corre en el pool de procesos
+(app/core/workers.py), por eso no depende de la configuración de la app.
+
+Se aplica la orientación EXIF y se descartan todos los metadatos (EXIF con
+GPS, XMP, comentarios) salvo el perfil de color: en una app de reportes
+anónimos una foto no puede llevar la ubicación ni el modelo del teléfono.
+
+Si la imagen recodificada pesa más que la original, se conserva la original
+siempre que no haya nada que quitarle: sin metadatos, sin rotación EXIF y
+sin pasar de max_dimension. Si no, se sube la recodificada aunque pese más.
+"""
+
+import io
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+OUTPUT_FORMATS = {"WEBP": "webp", "JPEG": "jpg"}
+
+# Formatos de entrada que se pueden subir sin recodificar
+ORIGINAL_FORMATS = {"JPEG": "jpg", "PNG": "png", "WEBP": "webp"}
+
+# Claves de image.info que no son metadatos del usuario (parámetros de
+# codificación y perfil de color)
+SAFE_INFO_KEYS = {
+    "icc_profile", "dpi", "jfif", "jfif_version", "jfif_unit", "jfif_density",
+    "progressive", "progression", "adobe", "adobe_transform", "transparency",
+    "gamma", "srgb", "chromaticity", "aspect", "lossless", "loop", "duration",
+    "background"
+}
+
+
+def normalize_image(data: bytes, max_dimension: int, output_format: str, quality: int) -> dict:
+    """
+    Decodifica, corrige la orientación, limita el lado mayor a max_dimension y
+    vuelve a codificar en output_format (WEBP o JPEG) sin metadatos.
+    Retorna {"data", "format", "width", "height", "original_bytes"}; si la
+    original es más liviana y no hay nada que quitarle, data es la original.
+    """
+    try:
+        image = Image.open(io.BytesIO(data))
+        original_format = image.format
+        original_size = image.size
+        # Sin claves fuera de SAFE_INFO_KEYS no hay EXIF, XMP, comentarios ni textos
+        clean = not (set(image.info) - SAFE_INFO_KEYS)
+        # En JPEG decodifica directamente a una escala reducida (mucho más rápido)
+        image.draft("RGB", (max_dimension, max_dimension))
+        image.load()
+        image = ImageOps.exif_transpose(image)
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        raise ValueError("Imagen inválida o dañada")
+
+    icc_profile = image.info.get("icc_profile")
+
+    has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+    if output_format == "JPEG" or not has_alpha:
+        if has_alpha:
+            # JPEG no tiene transparencia: se aplana sobre fondo blanco
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image.convert("RGBA"), mask=image.convert("RGBA").getchannel("A"))
+            image = background
+        else:
+            image = image.convert("RGB")
+    else:
+        image = image.convert("RGBA")
+
+    image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+
+    output = io.BytesIO()
+    options = {"quality": quality}
+    if icc_profile:
+        options["icc_profile"] = icc_profile
+    if output_format == "JPEG":
+        options.update(optimize=True, progressive=True)
+    else:
+        options["method"] = 4
+    # Sin exif=...: la imagen se guarda sin metadatos
+    image.save(output, format=output_format, **options)
+
+    if (
+        len(data) <= output.tell()
+        and clean
+        and original_format in ORIGINAL_FORMATS
+        and max(original_size) <= max_dimension
+    ):
+        return {
+            "data": data,
+            "format": ORIGINAL_FORMATS[original_format],
+            "width": original_size[0],
+            "height": original_size[1],
+            "original_bytes": len(data)
+        }
+
+    return {
+        "data": output.getvalue(),
+        "format": OUTPUT_FORMATS[output_format],
+        "width": image.width,
+        "height": image.height,
+        "original_bytes": len(data)
+    }
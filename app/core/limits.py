@@ -0,0 +1,85 @@
+# ARCHIVO: secure-report-back/app/core/limits.py
+"""
+Límites de tamaño para las subidas de archivos.
+
+- MaxBodySizeMiddleware rechaza con 413 las solicitudes cuyo Content-Length
+  supera el máximo, antes de que se lea el cuerpo. Las que no declaran
+  Content-Length (Transfer-Encoding: chunked) o declaran menos de lo que
+  envían se cortan con 413 apenas lo leído pasa el máximo.
+- ByteBudget lleva la cuenta de los bytes que un worker está subiendo a la
+  vez; si una solicitud no cabe se responde 503 en vez de acumular archivos
+  hasta que el proceso se quede sin memoria o disco.
+"""
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+
+class MaxBodySizeMiddleware:
+    """Middleware ASGI: 413 si el cuerpo supera max_bytes en las rutas con path_prefix"""
+
+    def __init__(self, app, max_bytes: int, path_prefix: str = "/"):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.path_prefix = path_prefix
+
+    def _detail(self) -> str:
+        return f"La solicitud supera el máximo de {self.max_bytes // (1024 * 1024)} MB"
+
+    def _too_large(self) -> JSONResponse:
+        return JSONResponse(status_code=413, content={"detail": self._detail()})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.path_prefix):
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length and content_length.isdigit() and int(content_length) > self.max_bytes:
+            await self._too_large()(scope, receive, send)
+            return
+
+        received = 0
+        started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # FastAPI convierte la HTTPException en la respuesta 413 aunque
+                    # ocurra mientras parsea el formulario
+                    raise HTTPException(status_code=413, detail=self._detail())
+            return message
+
+        async def tracked_send(message):
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracked_send)
+        except HTTPException as e:
+            # Si el endpoint leyó el cuerpo fuera de FastAPI la excepción llega hasta acá
+            if e.status_code != 413 or started:
+                raise
+            await self._too_large()(scope, receive, send)
+
+
+class ByteBudget:
+    """Presupuesto de bytes en tránsito por worker (un solo event loop, sin locks)"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.in_use = 0
+
+    def try_acquire(self, size: int) -> bool:
+        if self.in_use + size > self.max_bytes:
+            return False
+        self.in_use += size
+        return True
+
+    def release(self, size: int):
+        self.in_use = max(0, self.in_use - size)
@@ -0,0 +1,52 @@
+# ARCHIVO: secure-report-back/app/core/pdf.py
+"""
+Extracción de texto de PDFs. count_pages y parse_page_range corren en el
+pool de procesos (app/core/workers.py), por eso reciben la ruta del archivo
+y no el contenido.
+
+El texto se guarda por página comprimido con zlib: los manuales grandes no
+llegan al límite de 16 MB de BSON y se lee/transfiere mucho menos.
+"""
+
+import zlib
+import fitz
+
+
+def compress_page(text: str) -> bytes:
+    return zlib.compress(text.encode("utf-8"), 6)
+
+
+def decompress_page(data: bytes) -> str:
+    return zlib.decompress(data).decode("utf-8")
+
+
+def count_pages(path: str) -> int:
+    """Número de páginas del PDF (falla si el archivo no es un PDF válido)"""
+    with fitz.open(path) as pdf_doc:
+        return pdf_doc.page_count
+
+
+def parse_page_range(path: str, start: int, end: int) -> list:
+    """
+    Extrae las páginas [start, end) y las comprime.
+    Retorna [{"page", "text", "raw_bytes"}] con "page" numerada desde 1
+    y "text" comprimido.
+    """
+    pages = []
+    with fitz.open(path) as pdf_doc:
+        for number in range(start, end):
+            raw = pdf_doc[number].get_text().encode("utf-8")
+            pages.append({
+                "page": number + 1,
+                "text": zlib.compress(raw, 6),
+                "raw_bytes": len(raw)
+            })
+    return pages
+
+
+def page_ranges(page_count: int, pages_per_task: int) -> list:
+    """Divide [0, page_count) en rangos de hasta pages_per_task páginas"""
+    return [
+        (start, min(start + pages_per_task, page_count))
+        for start in range(0, page_count, pages_per_task)
+    ]
@@ -0,0 +1,143 @@
+# ARCHIVO: secure-report-back/app/core/prompt.py
+"""
+Armado del prompt del chat con presupuesto de tokens por sección.
+
+Orden de los mensajes (pensado para la caché de prefijos del proveedor):
+1. Prompt de sistema (estático, idéntico en todas las consultas)
+2. Historial de la sesión (crece turno a turno, así el prefijo se reutiliza)
+3. Mensaje final con el contexto recuperado y la pregunta (cambia siempre)
+
+Cada sección se recorta a su presupuesto. Si el total supera
+CHAT_PROMPT_MAX_TOKENS se recorta en orden de prioridad inversa:
+primero el historial más antiguo, luego los fragmentos menos relevantes
+y por último la pregunta. El prompt de sistema no se recorta más.
+"""
+
+import tiktoken
+from app.core.config import settings
+
+_encoding = None
+_encoding_loaded = False
+
+
+def _get_encoding():
+    """
+    Tokenizador del modelo configurado. tiktoken descarga el vocabulario la
+    primera vez (la imagen Docker lo precarga); si no puede, retorna None y
+    los tokens se estiman por caracteres.
+    """
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        try:
+            try:
+                _encoding = tiktoken.encoding_for_model(settings.OPENAI_MODEL)
+            except KeyError:
+                _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            print(f"X No se pudo cargar el tokenizador, se estimarán los tokens: {e}")
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    encoding = _get_encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Recorta un texto a max_tokens conservando el inicio"""
+    if max_tokens <= 0:
+        return ""
+    encoding = _get_encoding()
+    if encoding is None:
+        return text[:max_tokens * 4]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
+
+
+def _fit_in_order(items: list, budget: int, contiguous: bool = False) -> list:
+    """
+    Toma items (ya contados) en orden mientras quepan en el presupuesto.
+    Con contiguous=True se detiene en el primero que no cabe.
+    """
+    selected = []
+    used = 0
+    for item in items:
+        if used + item["tokens"] > budget:
+            if contiguous:
+                break
+            continue
+        selected.append(item)
+        used += item["tokens"]
+    return selected
+
+
+def ensamblar_prompt(system: str, chunks: list, history: list, question: str) -> tuple:
+    """
+    Arma los mensajes para OpenAI respetando los presupuestos de tokens.
+
+    - chunks: fragmentos recuperados, del más al menos relevante
+    - history: mensajes {"role", "content"} del más antiguo al más reciente
+
+    Retorna (messages, usage) donde usage tiene los tokens por sección.
+    """
+    system = truncate_tokens(system, settings.CHAT_BUDGET_SYSTEM)
+    question = truncate_tokens(question, settings.CHAT_BUDGET_QUESTION)
+    system_tokens = count_tokens(system)
+    question_tokens = count_tokens(question)
+
+    context = _fit_in_order(
+        [{**c, "tokens": count_tokens(c["text"])} for c in chunks],
+        settings.CHAT_CONTEXT_MAX_TOKENS
+    )
+    # El historial se llena desde el mensaje más reciente
+    recent = _fit_in_order(
+        [{**m, "tokens": count_tokens(m["content"])} for m in reversed(history)],
+        settings.CHAT_BUDGET_HISTORY,
+        contiguous=True
+    )
+
+    total = (
+        system_tokens + question_tokens
+        + sum(c["tokens"] for c in context)
+        + sum(m["tokens"] for m in recent)
+    )
+    trimmed = False
+
+    # Recorte por prioridad si el total supera el máximo del prompt
+    while total > settings.CHAT_PROMPT_MAX_TOKENS and recent:
+        total -= recent.pop()["tokens"]
+        trimmed = True
+    while total > settings.CHAT_PROMPT_MAX_TOKENS and context:
+        total -= context.pop()["tokens"]
+        trimmed = True
+    if total > settings.CHAT_PROMPT_MAX_TOKENS:
+        question = truncate_tokens(question, question_tokens - (total - settings.CHAT_PROMPT_MAX_TOKENS))
+        total -= question_tokens
+        question_tokens = count_tokens(question)
+        total += question_tokens
+        trimmed = True
+
+    context_text = "\n\n---\n\n".join(c["text"] for c in context)
+    messages = [{"role": "system", "content": system}]
+    messages += [{"role": m["role"], "content": m["content"]} for m in reversed(recent)]
+    messages.append({
+        "role": "user",
+        "content": f"INFORMACION DE REFERENCIA:\n{context_text}\n\nPregunta: {question}"
+    })
+
+    usage = {
+        "system": system_tokens,
+        "history": sum(m["tokens"] for m in recent),
+        "context": sum(c["tokens"] for c in context),
+        "question": question_tokens,
+        "total": total,
+        "history_messages": len(recent),
+        "context_chunks": len(context),
+        "trimmed": trimmed
+    }
+    return messages, usage
@@ -0,0 +1,135 @@
+# ARCHIVO: secure-report-back/app/core/retrieval.py
+"""
+Recuperación léxica (BM25) sobre fragmentos de los PDFs cargados.
+
+El índice es invertido: cada término guarda la lista de fragmentos donde
+aparece y su frecuencia, así una búsqueda solo recorre los fragmentos que
+comparten términos con la pregunta.
+"""
+
+import heapq
+import math
+import re
+import unicodedata
+from collections import Counter
+
+_TOKEN_RE = re.compile(r"\w+")
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+|\n")
+
+STOPWORDS = frozenset("""
+a al algo algun alguna algunas alguno algunos ante antes aqui asi aun cada como con contra cual
+cuales cuando de del desde donde dos el ella ellas ello ellos en entre era eran es esa esas ese eso
+esos esta estan estas este esto estos fue fueron ha hace hacer hacia han hasta hay la las le les lo
+los mas me mi mis mucho muy nada ni no nos o otra otras otro otros para pero poco por porque que
+quien se segun ser si sin sobre son su sus tambien tan te tener tiene tienen todo todos tu tus un una
+uno unos y ya yo
+""".split())
+
+
+def normalize(text: str) -> str:
+    """Minúsculas y sin tildes"""
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def tokenize(text: str) -> list:
+    """Términos indexables de un texto"""
+    return [
+        t for t in _TOKEN_RE.findall(normalize(text))
+        if len(t) > 1 and t not in STOPWORDS
+    ]
+
+
+def normalize_question(question: str) -> str:
+    """Pregunta en minúsculas, sin tildes, sin signos y con espacios simples"""
+    return " ".join(_TOKEN_RE.findall(normalize(question)))
+
+
+def _split_long(paragraph: str, max_chars: int) -> list:
+    """Divide un párrafo largo por oraciones/líneas en piezas de hasta max_chars"""
+    pieces = []
+    current = ""
+    for sentence in _SENTENCE_RE.split(paragraph):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        while len(sentence) > max_chars:
+            pieces.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        if current and len(current) + len(sentence) + 1 > max_chars:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def chunk_pages(pages: list, max_chars: int) -> list:
+    """
+    Divide el texto de cada página en fragmentos de hasta max_chars,
+    agrupando párrafos consecutivos. Retorna [{"page", "text"}].
+    """
+    chunks = []
+    for page_number, page_text in enumerate(pages, start=1):
+        current = ""
+        for paragraph in _PARAGRAPH_RE.split(page_text):
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            for piece in _split_long(paragraph, max_chars):
+                if current and len(current) + len(piece) + 2 > max_chars:
+                    chunks.append({"page": page_number, "text": current})
+                    current = piece
+                else:
+                    current = f"{current}\n\n{piece}" if current else piece
+        if current:
+            chunks.append({"page": page_number, "text": current})
+    return chunks
+
+
+class BM25Index:
+    """Índice BM25 en memoria sobre una lista de fragmentos {"text", ...}"""
+
+    def __init__(self, chunks: list, k1: float = 1.5, b: float = 0.75):
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+        self.postings = {}
+        self.lengths = []
+
+        for position, chunk in enumerate(chunks):
+            terms = Counter(tokenize(chunk["text"]))
+            self.lengths.append(sum(terms.values()))
+            for term, freq in terms.items():
+                self.postings.setdefault(term, []).append((position, freq))
+
+        total = len(chunks)
+        self.avg_length = (sum(self.lengths) / total) if total else 0.0
+        self.idf = {
+            term: math.log(1 + (total - len(plist) + 0.5) / (len(plist) + 0.5))
+            for term, plist in self.postings.items()
+        }
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def search(self, query: str, k: int) -> list:
+        """Los k fragmentos más relevantes, de mayor a menor puntaje"""
+        if not self.chunks:
+            return []
+
+        scores = {}
+        for term in set(tokenize(query)):
+            plist = self.postings.get(term)
+            if not plist:
+                continue
+            idf = self.idf[term]
+            for position, freq in plist:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[position] / self.avg_length)
+                scores[position] = scores.get(position, 0.0) + idf * freq * (self.k1 + 1) / (freq + norm)
+
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [{**self.chunks[position], "score": score} for position, score in best]
@@ -0,0 +1,190 @@
+# ARCHIVO: secure-report-back/app/core/security.py
+"""
+Contraseñas y tokens de acceso.
+
+bcrypt es lento a propósito (~100-300 ms con el costo por defecto); se ejecuta
+en un pool de hilos acotado (BCRYPT_MAX_THREADS) para no bloquear el event
+loop durante el registro y el login. El costo se configura con BCRYPT_ROUNDS;
+los hashes guardados llevan su propio costo, así que cambiarlo no invalida
+las contraseñas existentes.
+
+Los reportes anónimos no tienen usuario: al crearlos se entrega un secreto
+del dueño (new_owner_token) que autoriza a agregarles archivos después.
+
+get_current_user valida el JWT de create_access_token y guarda los tokens ya
+verificados en una caché LRU hasta su expiración, así las llamadas repetidas
+no vuelven a verificar la firma ni a buscar el usuario en MongoDB.
+get_current_admin es la dependencia de los endpoints de administración:
+además exige role == "admin" (403 si no).
+"""
+
+import asyncio
+import hashlib
+import hmac
+import secrets
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from bcrypt import hashpw, checkpw, gensalt
+from fastapi import Depends, HTTPException, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from jose import JWTError, jwt
+from app.core.config import settings
+from app.db.mongo_async import get_user_by_id
+
+_bcrypt_pool = None
+
+
+def _get_bcrypt_pool() -> ThreadPoolExecutor:
+    global _bcrypt_pool
+    if _bcrypt_pool is None:
+        _bcrypt_pool = ThreadPoolExecutor(
+            max_workers=settings.BCRYPT_MAX_THREADS,
+            thread_name_prefix="bcrypt"
+        )
+    return _bcrypt_pool
+
+
+def shutdown_bcrypt_pool():
+    global _bcrypt_pool
+    if _bcrypt_pool is not None:
+        _bcrypt_pool.shutdown(wait=False, cancel_futures=True)
+        _bcrypt_pool = None
+
+
+def _hash_password(password: str, rounds: int) -> str:
+    return hashpw(password.encode(), gensalt(rounds=rounds)).decode()
+
+
+def _verify_password(password: str, hashed: str) -> bool:
+    try:
+        return checkpw(password.encode(), hashed.encode())
+    except ValueError:
+        # Hash guardado con formato inválido
+        return False
+
+
+async def hash_password(password: str) -> str:
+    """Hashea contraseña con bcrypt fuera del event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_bcrypt_pool(), _hash_password, password, settings.BCRYPT_ROUNDS)
+
+
+async def verify_password(password: str, hashed: str) -> bool:
+    """Verifica contraseña contra hash fuera del event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_bcrypt_pool(), _verify_password, password, hashed)
+
+
+def create_access_token(user_id: str) -> str:
+    """Crea JWT token"""
+    payload = {
+        "sub": user_id,
+        "exp": datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    }
+    return jwt.encode(payload, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+
+
+def new_owner_token() -> tuple:
+    """
+    Secreto del dueño de un reporte anónimo. Retorna (token, hash): el token
+    se entrega una sola vez al crear el reporte y solo se guarda el hash.
+    """
+    token = secrets.token_urlsafe(32)
+    return token, hash_owner_token(token)
+
+
+def hash_owner_token(token: str) -> str:
+    # El token es aleatorio de 256 bits: basta SHA-256, sin sal ni bcrypt
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def verify_owner_token(token: str, stored_hash: str) -> bool:
+    if not token or not stored_hash:
+        return False
+    return hmac.compare_digest(hash_owner_token(token), stored_hash)
+
+
+class TokenCache:
+    """Caché LRU de tokens verificados; cada entrada vence con el exp del token"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def get(self, token: str):
+        entry = self._entries.get(token)
+        if entry is None:
+            return None
+        expires_at, user = entry
+        if expires_at <= time.time():
+            del self._entries[token]
+            return None
+        self._entries.move_to_end(token)
+        return user
+
+    def set(self, token: str, expires_at: float, user: dict):
+        if self.max_entries <= 0:
+            return
+        self._entries[token] = (expires_at, user)
+        self._entries.move_to_end(token)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+token_cache = TokenCache(settings.AUTH_TOKEN_CACHE_SIZE)
+
+_bearer = HTTPBearer(auto_error=False)
+
+
+def _unauthorized(detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"}
+    )
+
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(_bearer)) -> dict:
+    """
+    Dependencia para endpoints autenticados (header Authorization: Bearer <token>).
+    Retorna {"id", "email", "nombre", "role"} del usuario del token.
+    """
+    if credentials is None:
+        raise _unauthorized("No autenticado")
+
+    token = credentials.credentials
+    user = token_cache.get(token)
+    if user is not None:
+        return user
+
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        user_id = payload["sub"]
+        expires_at = float(payload["exp"])
+    except (JWTError, KeyError, TypeError, ValueError):
+        raise _unauthorized("Token inválido o vencido")
+
+    db_user = await get_user_by_id(user_id)
+    if not db_user:
+        raise _unauthorized("Token inválido o vencido")
+
+    user = {
+        "id": str(db_user["_id"]),
+        "email": db_user["email"],
+        "nombre": db_user["nombre"],
+        "role": db_user.get("role")
+    }
+    token_cache.set(token, expires_at, user)
+    return user
+
+
+async def get_current_admin(user: dict = Depends(get_current_user)) -> dict:
+    """Dependencia para endpoints de administración: token válido y rol de administrador"""
+    if user.get("role") != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Se requiere un usuario administrador"
+        )
+    return user
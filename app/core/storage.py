@@ -0,0 +1,196 @@
+# ARCHIVO: secure-report-back/app/core/storage.py
+"""
+Almacenamiento de archivos multimedia.
+
+Los routers suben archivos a través de StorageBackend. Se elige con
+MEDIA_STORAGE_BACKEND:
+- "cloudinary": sube por partes a Cloudinary (producción)
+- "local": guarda en MEDIA_LOCAL_DIR y los sirve la app en MEDIA_LOCAL_BASE_URL
+  (desarrollo y pruebas de rendimiento sin Cloudinary)
+
+upload() y delete() son bloqueantes; los routers las llaman en un hilo.
+
+La subida directa (el cliente sube al almacenamiento con parámetros firmados
+y el almacenamiento avisa a la API al terminar) solo existe en Cloudinary.
+"""
+
+import json
+import os
+import re
+import shutil
+import time
+from abc import ABC, abstractmethod
+from uuid import uuid4
+import cloudinary
+import cloudinary.uploader
+import cloudinary.utils
+from cloudinary.exceptions import GeneralError, RateLimited
+from app.core.config import settings
+
+FOLDER = "secure-report"
+
+
+class StorageBackend(ABC):
+    """Destino de los archivos subidos"""
+
+    # Errores transitorios: el router reintenta la subida con backoff
+    retryable_errors: tuple = ()
+
+    @abstractmethod
+    def upload(self, fileobj, filename: str, resource_type: str, part_timeout: float = None) -> dict:
+        """
+        Sube el archivo desde el inicio sin leerlo completo en memoria.
+        part_timeout limita cada request de red de la subida, no el archivo completo.
+        Retorna {"url", "public_id", "format", "bytes"}.
+        """
+
+    def is_retryable(self, error: Exception) -> bool:
+        return isinstance(error, self.retryable_errors)
+
+    def delete(self, public_id: str, resource_type: str):
+        raise NotImplementedError
+
+    def sign_upload(self, public_id: str, resource_type: str, allowed_formats: list, notification_url: str) -> dict:
+        """
+        Parámetros firmados para que el cliente suba un archivo directo al
+        almacenamiento con ese public_id. Retorna {"upload_url", "fields"}.
+        """
+        raise NotImplementedError
+
+    def parse_callback(self, body: bytes, headers, max_age: int) -> dict:
+        """
+        Verifica la firma del aviso de subida completada y retorna
+        {"public_id", "resource_type", "url", "format", "bytes", "created_at"}.
+        Lanza ValueError si la firma no es válida.
+        """
+        raise NotImplementedError
+
+
+class _SinCerrar:
+    """Envuelve un archivo para que upload_large no lo cierre y se pueda reintentar"""
+
+    def __init__(self, fileobj):
+        self._fileobj = fileobj
+
+    def __getattr__(self, name):
+        return getattr(self._fileobj, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def close(self):
+        pass
+
+
+class CloudinaryStorage(StorageBackend):
+    # GeneralError cubre errores de red, timeouts y respuestas 5xx
+    retryable_errors = (GeneralError, RateLimited)
+
+    def __init__(self):
+        cloudinary.config(
+            cloud_name=settings.CLOUDINARY_CLOUD_NAME,
+            api_key=settings.CLOUDINARY_API_KEY,
+            api_secret=settings.CLOUDINARY_API_SECRET,
+            secure=True
+        )
+
+    def upload(self, fileobj, filename: str, resource_type: str, part_timeout: float = None) -> dict:
+        fileobj.seek(0)
+        result = cloudinary.uploader.upload_large(
+            _SinCerrar(fileobj),
+            resource_type=resource_type,
+            folder=FOLDER,  # Carpeta en Cloudinary
+            use_filename=True,
+            unique_filename=True,
+            filename=filename,
+            chunk_size=settings.MEDIA_UPLOAD_CHUNK_SIZE,
+            timeout=part_timeout  # por cada parte
+        )
+        return {
+            "url": result["secure_url"],
+            "public_id": result["public_id"],
+            "format": result.get("format"),
+            "bytes": result["bytes"]
+        }
+
+    def delete(self, public_id: str, resource_type: str):
+        cloudinary.uploader.destroy(public_id, resource_type=resource_type, invalidate=True)
+
+    def sign_upload(self, public_id: str, resource_type: str, allowed_formats: list, notification_url: str) -> dict:
+        # Todo lo firmado queda fijo: el cliente no puede cambiar el destino ni el aviso
+        params = {
+            "timestamp": int(time.time()),
+            "public_id": public_id,
+            "allowed_formats": ",".join(allowed_formats),
+            "notification_url": notification_url,
+            "overwrite": "false"
+        }
+        if resource_type == "image":
+            # Transformación al recibir: limita el tamaño y Cloudinary descarta
+            # los metadatos (EXIF/GPS) al guardar la imagen transformada
+            size = settings.MEDIA_IMAGE_MAX_DIMENSION
+            params["transformation"] = f"c_limit,w_{size},h_{size}/q_{settings.MEDIA_IMAGE_QUALITY}"
+        signature = cloudinary.utils.api_sign_request(params, settings.CLOUDINARY_API_SECRET)
+        return {
+            "upload_url": cloudinary.utils.cloudinary_api_url("upload", resource_type=resource_type),
+            "fields": {**params, "signature": signature, "api_key": settings.CLOUDINARY_API_KEY}
+        }
+
+    def parse_callback(self, body: bytes, headers, max_age: int) -> dict:
+        timestamp = headers.get("x-cld-timestamp", "")
+        signature = headers.get("x-cld-signature", "")
+        text = body.decode("utf-8")
+        if not timestamp.isdigit() or not cloudinary.utils.verify_notification_signature(
+            text, int(timestamp), signature, valid_for=max_age
+        ):
+            raise ValueError("Firma del aviso inválida")
+
+        notification = json.loads(text)
+        if notification.get("notification_type") != "upload":
+            raise ValueError("El aviso no es de una subida")
+        return {
+            "public_id": notification["public_id"],
+            "resource_type": notification["resource_type"],
+            "url": notification["secure_url"],
+            "format": notification.get("format"),
+            "bytes": notification["bytes"],
+            "created_at": notification.get("created_at")
+        }
+
+
+class LocalStorage(StorageBackend):
+    """Escribe en disco local: sin red, no hay timeouts ni errores transitorios que reintentar"""
+
+    def __init__(self, root: str, base_url: str):
+        self.root = root
+        self.base_url = base_url.rstrip("/")
+
+    def upload(self, fileobj, filename: str, resource_type: str, part_timeout: float = None) -> dict:
+        stem, ext = os.path.splitext(os.path.basename(filename or "archivo"))
+        stem = re.sub(r"[^A-Za-z0-9_-]+", "_", stem)[:50] or "archivo"
+        ext = re.sub(r"[^A-Za-z0-9.]+", "", ext.lower())
+        public_id = f"{FOLDER}/{stem}_{uuid4().hex[:8]}"
+
+        path = os.path.join(self.root, public_id + ext)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fileobj.seek(0)
+        with open(path, "wb") as destino:
+            shutil.copyfileobj(fileobj, destino, length=settings.MEDIA_UPLOAD_CHUNK_SIZE)
+
+        return {
+            "url": f"{self.base_url}/{public_id}{ext}",
+            "public_id": public_id,
+            "format": ext.lstrip(".") or None,
+            "bytes": os.path.getsize(path)
+        }
+
+
+def get_storage() -> StorageBackend:
+    if settings.MEDIA_STORAGE_BACKEND == "local":
+        return LocalStorage(settings.MEDIA_LOCAL_DIR, settings.MEDIA_LOCAL_BASE_URL)
+    if settings.MEDIA_STORAGE_BACKEND == "cloudinary":
+        return CloudinaryStorage()
+    raise ValueError(f"MEDIA_STORAGE_BACKEND desconocido: {settings.MEDIA_STORAGE_BACKEND}")
@@ -0,0 +1,63 @@
+# ARCHIVO: secure-report-back/app/core/workers.py
+"""
+Pools de procesos para trabajo de CPU (parseo de PDFs, etc.) fuera del event loop.
+
+Cada pool se crea al primer uso y se cierran todos en el shutdown de la app.
+Hay uno por tipo de trabajo ("default" para los PDFs, "images" para la
+normalización de imágenes) para que una carga larga de PDFs no deje las
+subidas de fotos esperando en la misma cola. Usan "spawn" para que los
+procesos hijos no hereden los clientes de MongoDB ni los hilos del proceso
+principal; las funciones que se envían deben estar definidas a nivel de
+módulo y no depender de la configuración de la app.
+"""
+
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from app.core.config import settings
+
+_pools = {}
+
+
+def _pool_size(name: str) -> int:
+    if name == "images":
+        return settings.MEDIA_IMAGE_WORKER_PROCESSES
+    return settings.WORKER_PROCESSES
+
+
+def get_pool(name: str = "default") -> ProcessPoolExecutor:
+    pool = _pools.get(name)
+    if pool is None:
+        pool = ProcessPoolExecutor(
+            max_workers=_pool_size(name),
+            mp_context=multiprocessing.get_context("spawn")
+        )
+        _pools[name] = pool
+    return pool
+
+
+async def run_in_pool(name: str, fn, *args, **kwargs):
+    """Ejecuta fn(*args, **kwargs) en el pool de procesos name y espera el resultado"""
+    loop = asyncio.get_running_loop()
+    pool = get_pool(name)
+    try:
+        return await loop.run_in_executor(pool, partial(fn, *args, **kwargs))
+    except BrokenProcessPool:
+        # Un proceso murió (ej. un PDF que hace caer a fitz): el pool ya no sirve,
+        # se descarta para que la próxima llamada cree uno nuevo
+        if _pools.get(name) is pool:
+            del _pools[name]
+        raise
+
+
+async def run_in_process(fn, *args, **kwargs):
+    """Ejecuta fn(*args, **kwargs) en el pool de procesos por defecto"""
+    return await run_in_pool("default", fn, *args, **kwargs)
+
+
+def shutdown_pool():
+    for pool in _pools.values():
+        pool.shutdown(wait=False, cancel_futures=True)
+    _pools.clear()
@@ -0,0 +1,101 @@
+# ARCHIVO: secure-report-back/app/db/answer_cache.py
+"""
+Caché de respuestas del chat para preguntas repetidas.
+
+La clave es la pregunta normalizada + la versión del corpus + el modelo, así
+una carga de PDF invalida las respuestas anteriores. Primer nivel en memoria
+(LRU + TTL por proceso); segundo nivel opcional en MongoDB, compartido entre
+workers (CHAT_CACHE_SHARED).
+"""
+
+import hashlib
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from app.core.config import settings
+from app.core.retrieval import normalize_question
+from app.db.mongo_async import db
+
+CACHE_COLLECTION = "chat_answer_cache"
+
+
+class AnswerCache:
+    """Caché LRU con expiración y contadores de aciertos/fallos"""
+
+    def __init__(self, max_entries: int, ttl_seconds: int, collection=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.collection = collection
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(question: str, corpus_version) -> str:
+        raw = f"{settings.OPENAI_MODEL}|{corpus_version}|{normalize_question(question)}"
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def _get_local(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, answer = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return answer
+
+    def _set_local(self, key: str, answer: str):
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, answer)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get(self, key: str):
+        """Respuesta cacheada o None"""
+        answer = self._get_local(key)
+        if answer is not None:
+            self.hits += 1
+            return answer
+
+        if self.collection is not None:
+            doc = await self.collection.find_one({"_id": key}, {"answer": 1, "created_at": 1})
+            # El monitor de TTL de MongoDB corre cada ~60 s; se verifica igual
+            if doc and doc["created_at"] > datetime.utcnow() - timedelta(seconds=self.ttl_seconds):
+                self._set_local(key, doc["answer"])
+                self.shared_hits += 1
+                return doc["answer"]
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, answer: str):
+        self._set_local(key, answer)
+        if self.collection is not None:
+            await self.collection.update_one(
+                {"_id": key},
+                {"$set": {"answer": answer, "created_at": datetime.utcnow()}},
+                upsert=True
+            )
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.shared_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "shared": self.collection is not None,
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.shared_hits) / lookups, 4) if lookups else 0.0
+        }
+
+
+answer_cache = AnswerCache(
+    max_entries=settings.CHAT_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.CHAT_CACHE_TTL_SECONDS,
+    collection=db[CACHE_COLLECTION] if settings.CHAT_CACHE_SHARED else None
+)
@@ -0,0 +1,84 @@
+# ARCHIVO: secure-report-back/app/db/corpus.py
+"""
+Índice de recuperación sobre los PDFs cargados, cacheado por proceso.
+
+El índice se asocia a la versión del corpus guardada en `corpus_state`.
+La carga de un PDF incrementa esa versión; cada worker la consulta como máximo
+una vez cada CHAT_CORPUS_POLL_SECONDS y reconstruye el índice solo si cambió.
+Entre consultas el chat no lee MongoDB para el contexto.
+"""
+
+import asyncio
+import time
+from app.core.config import settings
+from app.core.pdf import decompress_page
+from app.core.retrieval import BM25Index, chunk_pages
+from app.db.mongo_async import (
+    get_all_document_pages, get_legacy_document_contents,
+    get_corpus_version, bump_corpus_version
+)
+
+_index = None
+_version = None
+_checked_at = 0.0
+_lock = asyncio.Lock()
+
+
+def _build_index(pages: list, legacy_documents: list) -> BM25Index:
+    """Descomprime y fragmenta las páginas y arma el índice (corre en un hilo)"""
+    chunks = []
+    for page in pages:
+        for chunk in chunk_pages([decompress_page(page["text"])], settings.CHAT_CHUNK_MAX_CHARS):
+            chunks.append({
+                "document_id": page["document_id"],
+                "file_name": page["file_name"],
+                "page": page["page"],
+                "text": chunk["text"]
+            })
+
+    # Documentos antiguos con el texto completo en `content`
+    for document in legacy_documents:
+        for chunk in chunk_pages([document.get("content", "")], settings.CHAT_CHUNK_MAX_CHARS):
+            chunks.append({
+                "document_id": document.get("document_id"),
+                "file_name": document.get("file_name"),
+                "page": None,
+                "text": chunk["text"]
+            })
+
+    return BM25Index(chunks)
+
+
+async def get_corpus_index() -> BM25Index:
+    """Índice BM25 del corpus, reconstruido solo cuando cambia su versión"""
+    global _index, _version, _checked_at
+
+    if _index is not None and time.monotonic() - _checked_at < settings.CHAT_CORPUS_POLL_SECONDS:
+        return _index
+
+    async with _lock:
+        if _index is not None and time.monotonic() - _checked_at < settings.CHAT_CORPUS_POLL_SECONDS:
+            return _index
+
+        version = await get_corpus_version()
+        if _index is None or version != _version:
+            pages = await get_all_document_pages()
+            legacy_documents = await get_legacy_document_contents()
+            _index = await asyncio.to_thread(_build_index, pages, legacy_documents)
+            _version = version
+            print(f"> Corpus de chat cargado: versión {version}, {len(_index)} fragmentos")
+
+        _checked_at = time.monotonic()
+        return _index
+
+
+def current_corpus_version():
+    """Versión del corpus con la que se construyó el índice cargado"""
+    return _version
+
+
+async def publish_corpus_change():
+    """Marca el corpus como modificado en todos los workers (incluido este)"""
+    global _checked_at
+    await bump_corpus_version()
+    _checked_at = 0.0
@@ -0,0 +1,69 @@
+# ARCHIVO: secure-report-back/app/db/documents.py
+"""
+Migración de los documentos del chat al guardado por páginas comprimidas.
+
+Los documentos cargados antes tienen el texto completo en `content`, sin
+división por páginas: se migran como una sola página. Mientras no se migren,
+el chat los sigue usando desde `content`.
+
+    python -m app.db.documents migrate
+"""
+
+import sys
+from datetime import datetime
+from app.core.pdf import compress_page
+
+
+def migrate(db):
+    """Pasa los documentos sin `storage` a `document_pages` y libera `content`"""
+    documents = db["documents"]
+    total = 0
+
+    for document in documents.find({"storage": {"$exists": False}}):
+        document_id = document.get("document_id")
+        text = document.get("content", "")
+        page = {
+            "document_id": document_id,
+            "file_name": document.get("file_name"),
+            "page": 1,
+            "text": compress_page(text)
+        }
+
+        db["document_pages"].delete_many({"document_id": document_id})
+        db["document_pages"].insert_one(page)
+        documents.update_one(
+            {"_id": document["_id"]},
+            {
+                "$set": {
+                    "storage": "pages",
+                    "page_count": 1,
+                    "text_bytes": len(text.encode("utf-8")),
+                    "stored_bytes": len(page["text"])
+                },
+                "$unset": {"content": ""}
+            }
+        )
+        total += 1
+
+    if total:
+        db["corpus_state"].update_one(
+            {"_id": "corpus"},
+            {"$inc": {"version": 1}, "$set": {"updated_at": datetime.utcnow()}},
+            upsert=True
+        )
+    print(f"> {total} documentos migrados a páginas comprimidas")
+
+
+def main(argv):
+    command = argv[1] if len(argv) > 1 else ""
+    if command != "migrate":
+        print("Uso: python -m app.db.documents migrate")
+        return 2
+
+    from app.db.mongo import db
+    migrate(db)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
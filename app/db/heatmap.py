@@ -0,0 +1,80 @@
+# ARCHIVO: secure-report-back/app/db/heatmap.py
+"""
+Agregación de reportes por celdas geohash para mapas de calor.
+
+Cada reporte guarda `geohash` (calculado en create_report) con la precisión
+máxima; una celda de precisión menor es un prefijo, así que el mapa de calor
+es un $group sobre un prefijo del campo indexado.
+
+Para reportes creados antes de este campo:
+
+    python -m app.db.heatmap backfill
+"""
+
+import sys
+from pymongo import UpdateOne
+from app.core.config import settings
+from app.core.geohash import encode
+
+
+def report_geohash(location: dict) -> str:
+    """Geohash de la ubicación GeoJSON de un reporte"""
+    lng, lat = location["coordinates"][:2]
+    return encode(lat, lng, settings.REPORTS_GEOHASH_PRECISION)
+
+
+def heatmap_pipeline(precision: int, query: dict, max_cells: int) -> list:
+    """Pipeline que cuenta reportes por celda de la precisión dada"""
+    # $gt "" (en vez de $exists) da límites acotados sobre el índice de geohash,
+    # así el mapa sin filtros se resuelve solo con el índice, sin leer documentos
+    return [
+        {"$match": {**query, "geohash": {"$gt": ""}}},
+        {"$group": {
+            "_id": {"$substrCP": ["$geohash", 0, precision]},
+            "count": {"$sum": 1}
+        }},
+        {"$sort": {"count": -1}},
+        {"$limit": max_cells}
+    ]
+
+
+def backfill(db, batch_size: int = 1000):
+    """Calcula `geohash` para los reportes que no lo tienen"""
+    reports = db["reports"]
+    cursor = reports.find(
+        {"geohash": {"$exists": False}, "location.coordinates": {"$exists": True}},
+        {"location": 1}
+    ).batch_size(batch_size)
+
+    ops = []
+    total = 0
+    for report in cursor:
+        ops.append(UpdateOne(
+            {"_id": report["_id"]},
+            {"$set": {"geohash": report_geohash(report["location"])}}
+        ))
+        if len(ops) >= batch_size:
+            reports.bulk_write(ops, ordered=False)
+            total += len(ops)
+            ops = []
+
+    if ops:
+        reports.bulk_write(ops, ordered=False)
+        total += len(ops)
+
+    print(f"> geohash calculado para {total} reportes")
+
+
+def main(argv):
+    command = argv[1] if len(argv) > 1 else ""
+    if command != "backfill":
+        print("Uso: python -m app.db.heatmap backfill")
+        return 2
+
+    from app.db.mongo import db
+    backfill(db)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,454 @@
+# ARCHIVO: secure-report-back/app/db/indexes.py
+"""
+Registro declarativo de índices y de las consultas que deben usarlos.
+
+Uso:
+    python -m app.db.indexes ensure   # crea los índices registrados
+    python -m app.db.indexes check    # explain() de cada consulta, falla si hay COLLSCAN
+"""
+
+import sys
+from datetime import datetime
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+from app.core.config import settings
+
+# ===== ÍNDICES =====
+# Cada índice compuesto sigue el orden igualdad -> orden -> rango de las
+# consultas de los routers. Se usan los nombres por defecto de MongoDB para
+# no chocar con índices ya creados (ej. email_1).
+
+INDEXES = {
+    "users": [
+        IndexModel([("email", ASCENDING)], unique=True, background=True),
+    ],
+    "reports": [
+        # GET /api/reports/
+        IndexModel([("createdAt", DESCENDING), ("_id", DESCENDING)], background=True),
+        # GET /api/reports/user/{id}
+        IndexModel(
+            [("anonymousUserId", ASCENDING), ("createdAt", DESCENDING), ("_id", DESCENDING)],
+            background=True
+        ),
+        # Colas de moderación por estado / categoría
+        IndexModel(
+            [("status", ASCENDING), ("createdAt", DESCENDING), ("_id", DESCENDING)],
+            background=True
+        ),
+        IndexModel(
+            [("category", ASCENDING), ("createdAt", DESCENDING), ("_id", DESCENDING)],
+            background=True
+        ),
+        IndexModel(
+            [("status", ASCENDING), ("category", ASCENDING), ("createdAt", DESCENDING), ("_id", DESCENDING)],
+            background=True
+        ),
+        # Reintentos idempotentes: POST /api/reports/ y /bulk con clientKey
+        IndexModel(
+            [("anonymousUserId", ASCENDING), ("clientKey", ASCENDING)],
+            unique=True,
+            partialFilterExpression={"clientKey": {"$exists": True}},
+            background=True
+        ),
+        # Filtro por rango de updatedAt
+        IndexModel([("updatedAt", DESCENDING)], background=True),
+        # Consultas geoespaciales
+        IndexModel([("location", "2dsphere")], background=True),
+        # Mapa de calor: cubre el $match por fecha/categoría/estado y el $group por geohash
+        IndexModel(
+            [("createdAt", DESCENDING), ("category", ASCENDING), ("status", ASCENDING), ("geohash", ASCENDING)],
+            background=True
+        ),
+        # Mapa de calor sin rango de fechas (vista por defecto): recorre el índice por geohash
+        IndexModel(
+            [("geohash", ASCENDING), ("createdAt", DESCENDING), ("category", ASCENDING), ("status", ASCENDING)],
+            background=True
+        ),
+    ],
+    "report_stats": [
+        IndexModel([("day", ASCENDING), ("category", ASCENDING), ("status", ASCENDING)], background=True),
+    ],
+    "document_pages": [
+        IndexModel([("document_id", ASCENDING), ("page", ASCENDING)], background=True),
+    ],
+    "ingestion_jobs": [
+        IndexModel([("content_hash", ASCENDING), ("status", ASCENDING)], background=True),
+        IndexModel(
+            [("created_at", ASCENDING)],
+            expireAfterSeconds=settings.INGEST_JOB_TTL_DAYS * 86400,
+            background=True
+        ),
+    ],
+    "documents": [
+        IndexModel([("storage", ASCENDING), ("document_id", ASCENDING)], background=True),
+        # Un PDF se guarda una sola vez; los documentos antiguos no tienen hash
+        IndexModel(
+            [("content_hash", ASCENDING)],
+            unique=True,
+            partialFilterExpression={"content_hash": {"$exists": True}},
+            background=True
+        ),
+    ],
+    "media_upload_grants": [
+        # Se borran un día después de vencer
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=86400, background=True),
+    ],
+    "chat_answer_cache": [
+        IndexModel(
+            [("created_at", ASCENDING)],
+            expireAfterSeconds=settings.CHAT_CACHE_TTL_SECONDS,
+            background=True
+        ),
+    ],
+    "chat_history": [
+        IndexModel([("session_id", ASCENDING), ("timestamp", DESCENDING)], background=True),
+        # Expiración del historial. Si cambia CHAT_HISTORY_TTL_DAYS, ensure
+        # actualiza el índice existente con collMod.
+        IndexModel(
+            [("timestamp", ASCENDING)],
+            expireAfterSeconds=settings.CHAT_HISTORY_TTL_DAYS * 86400,
+            background=True
+        ),
+    ],
+}
+
+# Índices de versiones anteriores que ya cubre otro índice del registro;
+# ensure los borra si existen.
+OBSOLETE_INDEXES = {
+    # Lo creaba app/db/mongo.py al importarse. Es prefijo de (anonymousUserId,
+    # createdAt, _id), que sirve las mismas consultas y además el orden
+    "reports": ["anonymousUserId_1"],
+}
+
+# ===== CONSULTAS REGISTRADAS =====
+# Forma de cada consulta de los routers con valores de ejemplo. El comando
+# `check` ejecuta explain() sobre cada una.
+
+_SAMPLE_DATE = datetime(2026, 1, 1)
+
+QUERIES = [
+    {
+        "name": "reports.list_all",
+        "collection": "reports",
+        "filter": {},
+        "sort": [("createdAt", DESCENDING), ("_id", DESCENDING)],
+    },
+    {
+        "name": "reports.list_all.next_page",
+        "collection": "reports",
+        "filter": {
+            "$or": [
+                {"createdAt": {"$lt": _SAMPLE_DATE}},
+                {"createdAt": _SAMPLE_DATE, "_id": {"$lt": "rep_000000"}},
+            ]
+        },
+        "sort": [("createdAt", DESCENDING), ("_id", DESCENDING)],
+    },
+    {
+        "name": "reports.list_user",
+        "collection": "reports",
+        "filter": {"anonymousUserId": "anon_check"},
+        "sort": [("createdAt", DESCENDING), ("_id", DESCENDING)],
+    },
+    {
+        "name": "reports.by_id",
+        "collection": "reports",
+        "filter": {"_id": "rep_000000"},
+    },
+    {
+        "name": "reports.by_client_key",
+        "collection": "reports",
+        "filter": {"anonymousUserId": "anon_check", "clientKey": "check"},
+    },
+    {
+        "name": "reports.by_status",
+        "collection": "reports",
+        "filter": {"status": "pending"},
+        "sort": [("createdAt", DESCENDING), ("_id", DESCENDING)],
+    },
+    {
+        "name": "reports.by_category",
+        "collection": "reports",
+        "filter": {"category": "acoso"},
+        "sort": [("createdAt", DESCENDING), ("_id", DESCENDING)],
+    },
+    {
+        "name": "reports.moderation_queue",
+        "collection": "reports",
+        "filter": {
+            "status": {"$in": ["pending"]},
+            "category": {"$in": ["acoso"]},
+            "createdAt": {"$gte": _SAMPLE_DATE},
+        },
+        "sort": [("createdAt", DESCENDING), ("_id", DESCENDING)],
+    },
+    {
+        "name": "reports.by_updated_range",
+        "collection": "reports",
+        "filter": {"updatedAt": {"$gte": _SAMPLE_DATE}},
+        "sort": [("createdAt", DESCENDING), ("_id", DESCENDING)],
+    },
+    {
+        "name": "reports.near",
+        "collection": "reports",
+        "pipeline": [
+            {"$geoNear": {
+                "near": {"type": "Point", "coordinates": [-78.4678, -0.1807]},
+                "distanceField": "distance",
+                "maxDistance": 1000,
+                "query": {"status": {"$in": ["pending"]}},
+                "spherical": True,
+                "key": "location",
+            }},
+            {"$sort": {"distance": 1, "_id": 1}},
+            {"$limit": 51},
+        ],
+    },
+    {
+        "name": "reports.within",
+        "collection": "reports",
+        "filter": {
+            "location": {"$geoWithin": {"$geometry": {
+                "type": "Polygon",
+                "coordinates": [[[-78.6, -0.3], [-78.4, -0.3], [-78.4, -0.1], [-78.6, -0.1], [-78.6, -0.3]]],
+            }}},
+        },
+        "sort": [("createdAt", DESCENDING), ("_id", DESCENDING)],
+    },
+    {
+        "name": "reports.heatmap",
+        "collection": "reports",
+        "pipeline": [
+            {"$match": {"createdAt": {"$gte": _SAMPLE_DATE}, "geohash": {"$gt": ""}}},
+            {"$group": {"_id": {"$substrCP": ["$geohash", 0, 5]}, "count": {"$sum": 1}}},
+            {"$sort": {"count": -1}},
+            {"$limit": 2000},
+        ],
+    },
+    {
+        "name": "reports.heatmap.all_time",
+        "collection": "reports",
+        "pipeline": [
+            {"$match": {"geohash": {"$gt": ""}}},
+            {"$group": {"_id": {"$substrCP": ["$geohash", 0, 5]}, "count": {"$sum": 1}}},
+            {"$sort": {"count": -1}},
+            {"$limit": 2000},
+        ],
+    },
+    {
+        "name": "report_stats.range",
+        "collection": "report_stats",
+        "filter": {"day": {"$gte": _SAMPLE_DATE}, "category": {"$in": ["acoso"]}},
+    },
+    {
+        "name": "media_hashes.by_hash",
+        "collection": "media_hashes",
+        "filter": {"_id": "cloudinary:" + "0" * 64},
+    },
+    {
+        "name": "users.by_email",
+        "collection": "users",
+        "filter": {"email": "check@example.com"},
+    },
+    {
+        "name": "documents.ready",
+        "collection": "documents",
+        "filter": {"storage": "pages"},
+        "projection": {"_id": 0, "document_id": 1},
+    },
+    {
+        "name": "documents.by_hash",
+        "collection": "documents",
+        "filter": {"content_hash": "0" * 64},
+    },
+    {
+        "name": "document_pages.corpus",
+        "collection": "document_pages",
+        "filter": {"document_id": {"$in": ["check"]}},
+    },
+    {
+        "name": "ingestion_jobs.active_by_hash",
+        "collection": "ingestion_jobs",
+        "filter": {
+            "content_hash": "0" * 64,
+            "status": {"$in": ["queued", "parsing", "storing"]},
+            "updated_at": {"$gte": _SAMPLE_DATE},
+        },
+    },
+    {
+        "name": "chat_history.recent",
+        "collection": "chat_history",
+        "filter": {"session_id": "check"},
+        "sort": [("timestamp", DESCENDING)],
+        "limit": 5,
+    },
+]
+
+
+NAMESPACE_NOT_FOUND = 26
+INDEX_NOT_FOUND = 27
+INDEX_OPTIONS_CONFLICT = 85
+
+
+def _ttl_updates(models: list) -> list:
+    """Opciones de collMod para llevar los TTL del registro a los índices ya creados"""
+    return [
+        {"keyPattern": dict(model.document["key"]), "expireAfterSeconds": model.document["expireAfterSeconds"]}
+        for model in models
+        if "expireAfterSeconds" in model.document
+    ]
+
+
+async def _ensure_collection(db, collection_name: str, models: list):
+    collection = db[collection_name]
+    try:
+        await collection.create_indexes(models)
+    except OperationFailure as e:
+        if e.code != INDEX_OPTIONS_CONFLICT:
+            raise
+        # create_index no cambia el TTL de un índice existente: se hace con collMod
+        for index in _ttl_updates(models):
+            try:
+                await db.command("collMod", collection_name, index=index)
+            except OperationFailure as e:
+                if e.code != INDEX_NOT_FOUND:
+                    raise
+        await collection.create_indexes(models)
+
+    for name in OBSOLETE_INDEXES.get(collection_name, []):
+        try:
+            await collection.drop_index(name)
+        except OperationFailure as e:
+            if e.code not in (NAMESPACE_NOT_FOUND, INDEX_NOT_FOUND):
+                raise
+
+
+def _ensure_collection_sync(db, collection_name: str, models: list) -> list:
+    collection = db[collection_name]
+    try:
+        names = collection.create_indexes(models)
+    except OperationFailure as e:
+        if e.code != INDEX_OPTIONS_CONFLICT:
+            raise
+        for index in _ttl_updates(models):
+            try:
+                db.command("collMod", collection_name, index=index)
+            except OperationFailure as e:
+                if e.code != INDEX_NOT_FOUND:
+                    raise
+        names = collection.create_indexes(models)
+
+    for name in OBSOLETE_INDEXES.get(collection_name, []):
+        try:
+            collection.drop_index(name)
+            print(f"> {collection_name}: {name} eliminado")
+        except OperationFailure as e:
+            if e.code not in (NAMESPACE_NOT_FOUND, INDEX_NOT_FOUND):
+                raise
+    return names
+
+
+async def ensure_indexes(db) -> bool:
+    """
+    Crea los índices registrados (Motor). Pensado para correr en segundo plano.
+    Un error en una colección se informa y se sigue con las demás.
+    """
+    ok = True
+    for collection_name, models in INDEXES.items():
+        try:
+            await _ensure_collection(db, collection_name, models)
+        except Exception as e:
+            ok = False
+            print(f"X Índices de {collection_name}: {e}")
+    print("> Índices verificados" if ok else "X Índices verificados con errores")
+    return ok
+
+
+def ensure_indexes_sync(db) -> bool:
+    """Crea los índices registrados con el cliente síncrono"""
+    ok = True
+    for collection_name, models in INDEXES.items():
+        try:
+            names = _ensure_collection_sync(db, collection_name, models)
+            print(f"> {collection_name}: {', '.join(names)}")
+        except Exception as e:
+            ok = False
+            print(f"X {collection_name}: {e}")
+    return ok
+
+
+def _plan_stages(plan):
+    """Recorre un plan de explain() y retorna todas las etapas"""
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from _plan_stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from _plan_stages(item)
+
+
+def _winning_plans(explanation):
+    """Busca todos los winningPlan dentro de la salida de explain()"""
+    if isinstance(explanation, dict):
+        for key, value in explanation.items():
+            if key == "winningPlan":
+                yield value
+            else:
+                yield from _winning_plans(value)
+    elif isinstance(explanation, list):
+        for item in explanation:
+            yield from _winning_plans(item)
+
+
+def explain_query(db, query: dict) -> list:
+    """Ejecuta explain() de una consulta registrada y retorna sus etapas ganadoras"""
+    if "pipeline" in query:
+        explanation = db.command(
+            "aggregate", query["collection"],
+            pipeline=query["pipeline"],
+            explain=True
+        )
+    else:
+        cursor = db[query["collection"]].find(query["filter"], query.get("projection"))
+        if query.get("sort"):
+            cursor = cursor.sort(query["sort"])
+        if query.get("limit"):
+            cursor = cursor.limit(query["limit"])
+        explanation = cursor.explain()
+
+    stages = []
+    for plan in _winning_plans(explanation):
+        stages.extend(_plan_stages(plan))
+    return stages
+
+
+def check_queries(db) -> bool:
+    """Verifica que ninguna consulta registrada haga COLLSCAN"""
+    ok = True
+    for query in QUERIES:
+        stages = explain_query(db, query)
+        if "COLLSCAN" in stages:
+            ok = False
+            print(f"X {query['name']}: COLLSCAN ({' > '.join(stages)})")
+        else:
+            print(f"> {query['name']}: {' > '.join(stages)}")
+    return ok
+
+
+def main(argv):
+    command = argv[1] if len(argv) > 1 else "check"
+    from app.db.mongo import db
+
+    if command == "ensure":
+        return 0 if ensure_indexes_sync(db) else 1
+    if command == "check":
+        return 0 if check_queries(db) else 1
+
+    print(f"Comando desconocido: {command}. Usa 'ensure' o 'check'")
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,150 @@
+# ARCHIVO: secure-report-back/app/db/ingestion.py
+"""
+Carga de PDFs del chat en segundo plano.
+
+upload_document guarda el archivo en disco (calculando su SHA-256), crea un
+registro en `ingestion_jobs` y retorna enseguida. Si ya hay un documento o
+una carga en curso con el mismo hash no se vuelve a procesar. La carga corre
+como tarea del event loop del worker que recibió el archivo:
+
+1. Cuenta las páginas y divide el PDF en rangos de INGEST_PAGES_PER_TASK.
+2. Extrae y comprime cada rango en paralelo en el pool de procesos.
+3. Sube el PDF original a GridFS y guarda las páginas por lotes.
+4. Inserta la fila en `documents`, que es lo que hace visible el documento
+   al chat (ver get_all_document_pages). El índice único de content_hash
+   descarta la carga si otro worker terminó el mismo PDF antes.
+
+El progreso (páginas, bytes, errores) queda en `ingestion_jobs`, así
+cualquier worker puede responder GET /api/chat/upload/{job_id}.
+
+Mientras corre, la carga renueva updated_at cada INGEST_JOB_HEARTBEAT_SECONDS
+(también mientras espera turno). Si el worker se reinicia la carga deja de
+renovarse; al volver a subir el mismo PDF se marca como fallida y se empieza
+una nueva.
+"""
+
+import asyncio
+import os
+from datetime import datetime
+from pymongo.errors import DuplicateKeyError
+from app.core.config import settings
+from app.core.pdf import count_pages, parse_page_range, page_ranges
+from app.core.workers import run_in_process
+from app.db.corpus import publish_corpus_change
+from app.db.mongo_async import (
+    create_ingestion_job, update_ingestion_job, insert_document_pages,
+    delete_document_pages, store_original_pdf, delete_original_pdf, create_document
+)
+
+_tasks = set()
+_slots = asyncio.Semaphore(settings.INGEST_MAX_JOBS)
+
+
+async def _parse(job_id: str, path: str) -> list:
+    """Extrae todas las páginas en paralelo; retorna las páginas en orden"""
+    page_count = await run_in_process(count_pages, path)
+    await update_ingestion_job(job_id, {"status": "parsing", "pages_total": page_count})
+
+    async def parse_range(start: int, end: int):
+        try:
+            pages = await run_in_process(parse_page_range, path, start, end)
+        except Exception as e:
+            await update_ingestion_job(job_id, error=f"Páginas {start + 1}-{end}: {e}")
+            raise
+        await update_ingestion_job(job_id, inc={"pages_parsed": end - start})
+        return pages
+
+    results = await asyncio.gather(
+        *(parse_range(start, end) for start, end in page_ranges(page_count, settings.INGEST_PAGES_PER_TASK)),
+        return_exceptions=True
+    )
+    failed = [r for r in results if isinstance(r, BaseException)]
+    if failed:
+        raise failed[0]
+
+    return [page for range_pages in results for page in range_pages]
+
+
+async def _heartbeat(job_id: str):
+    """Renueva updated_at para que la carga no se considere abandonada"""
+    while True:
+        await asyncio.sleep(settings.INGEST_JOB_HEARTBEAT_SECONDS)
+        try:
+            await update_ingestion_job(job_id)
+        except Exception as e:
+            print(f"X ERROR al renovar la carga {job_id}: {e}")
+
+
+async def _run(job_id: str, document_id: str, file_name: str, path: str, content_hash: str):
+    file_id = None
+    heartbeat = asyncio.create_task(_heartbeat(job_id))
+    try:
+        async with _slots:
+            pages = await _parse(job_id, path)
+            text_bytes = sum(page["raw_bytes"] for page in pages)
+            stored_bytes = sum(len(page["text"]) for page in pages)
+
+            await update_ingestion_job(job_id, {
+                "status": "storing",
+                "text_bytes": text_bytes,
+                "stored_bytes": stored_bytes
+            })
+            file_id = await store_original_pdf(path, file_name, content_hash)
+
+            batch_size = settings.INGEST_PAGE_BATCH_SIZE
+            for start in range(0, len(pages), batch_size):
+                batch = pages[start:start + batch_size]
+                await insert_document_pages(document_id, file_name, batch)
+                await update_ingestion_job(job_id, inc={"pages_stored": len(batch)})
+
+            try:
+                await create_document(
+                    document_id, file_name, content_hash, file_id,
+                    page_count=len(pages),
+                    size_bytes=os.path.getsize(path),
+                    text_bytes=text_bytes,
+                    stored_bytes=stored_bytes
+                )
+            except DuplicateKeyError:
+                await delete_document_pages(document_id)
+                await delete_original_pdf(file_id)
+                await update_ingestion_job(job_id, {"status": "duplicate", "finished_at": datetime.utcnow()})
+                print(f"> PDF duplicado descartado: {file_name}")
+                return
+
+            await publish_corpus_change()
+
+        await update_ingestion_job(job_id, {"status": "completed", "finished_at": datetime.utcnow()})
+        print(
+            f"> PDF cargado: {file_name} ({len(pages)} páginas, "
+            f"texto {text_bytes} bytes, guardado {stored_bytes} bytes)"
+        )
+
+    except Exception as e:
+        print(f"X ERROR al cargar {file_name}: {e}")
+        try:
+            await delete_document_pages(document_id)
+            if file_id is not None:
+                await delete_original_pdf(file_id)
+            await update_ingestion_job(
+                job_id,
+                {"status": "failed", "finished_at": datetime.utcnow()},
+                error=str(e)
+            )
+        except Exception as cleanup_error:
+            print(f"X ERROR al marcar la carga {job_id} como fallida: {cleanup_error}")
+    finally:
+        heartbeat.cancel()
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+async def start_ingestion(job_id: str, document_id: str, file_name: str, path: str, content_hash: str) -> dict:
+    """Registra la carga y la lanza en segundo plano; path se borra al terminar"""
+    job = await create_ingestion_job(job_id, document_id, file_name, content_hash, temp_path=path)
+    task = asyncio.create_task(_run(job_id, document_id, file_name, path, content_hash))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return job
@@ -0,0 +1,785 @@
+# ARCHIVO: secure-report-back/app/db/mongo_async.py
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from app.core.config import settings
+from app.core.ids import new_ulid
+from app.db.pagination import REPORTS_SORT, fetch_page, encode_distance_cursor, decode_distance_cursor
+from app.db.stats import STATS_COLLECTION, bucket_inc, status_change_ops
+from app.db.heatmap import report_geohash, heatmap_pipeline
+from bson.objectid import ObjectId
+from datetime import datetime, timedelta, timezone
+
+# Cliente asíncrono (Motor) con pool de conexiones configurable.
+# Los routers usan este módulo para no bloquear el event loop.
+client = AsyncIOMotorClient(
+    settings.MONGODB_URI,
+    serverSelectionTimeoutMS=5000,
+    maxPoolSize=settings.MONGODB_MAX_POOL_SIZE,
+    minPoolSize=settings.MONGODB_MIN_POOL_SIZE,
+    maxIdleTimeMS=settings.MONGODB_MAX_IDLE_TIME_MS,
+    waitQueueTimeoutMS=settings.MONGODB_WAIT_QUEUE_TIMEOUT_MS
+)
+
+db = client[settings.MONGODB_DB_NAME]
+
+users_collection = db["users"]
+reports_collection = db["reports"]
+documents_collection = db["documents"]
+document_pages_collection = db["document_pages"]
+chat_history_collection = db["chat_history"]
+corpus_state_collection = db["corpus_state"]
+ingestion_jobs_collection = db["ingestion_jobs"]
+media_hashes_collection = db["media_hashes"]
+upload_grants_collection = db["media_upload_grants"]
+stats_collection = db[STATS_COLLECTION]
+
+# PDFs originales del chat
+pdf_bucket = AsyncIOMotorGridFSBucket(db, bucket_name="pdfs")
+
+# ===== FUNCIONES USUARIOS =====
+
+async def get_user_by_email(email: str):
+    return await users_collection.find_one({"email": email})
+
+
+async def create_user(nombre, apellido, fecha_nacimiento, direccion, email, hashed_password):
+    user_data = {
+        "nombre": nombre,
+        "apellido": apellido,
+        "fecha_nacimiento": fecha_nacimiento,
+        "direccion": direccion,
+        "email": email,
+        "password": hashed_password,
+        "role": "admin",
+        "created_at": datetime.utcnow()
+    }
+    result = await users_collection.insert_one(user_data)
+    return str(result.inserted_id)
+
+
+async def get_user_by_id(user_id: str):
+    try:
+        return await users_collection.find_one({"_id": ObjectId(user_id)})
+    except Exception:
+        return None
+
+
+# ===== FUNCIONES REPORTES =====
+
+
+# Reintentos si el _id generado ya existe (improbable con 80 bits aleatorios)
+REPORT_ID_ATTEMPTS = 3
+
+
+def generate_report_id(created_at: datetime = None) -> str:
+    """
+    ID de reporte ordenable por tiempo: rep_ + ULID. Con created_at (UTC sin
+    zona, como los de MongoDB) el ID usa ese mismo milisegundo.
+    """
+    timestamp_ms = None
+    if created_at is not None:
+        timestamp_ms = int(created_at.replace(tzinfo=timezone.utc).timestamp() * 1000)
+    return f"rep_{new_ulid(timestamp_ms)}"
+
+
+def _conflict_field(details: dict) -> str:
+    """Campo del índice único que rechazó la escritura (_id o clientKey)"""
+    key_pattern = (details or {}).get("keyPattern")
+    if key_pattern:
+        return "clientKey" if "clientKey" in key_pattern else "_id"
+    # Servidores sin keyPattern: el nombre del índice viene en el mensaje
+    return "clientKey" if "clientKey" in (details or {}).get("errmsg", "") else "_id"
+
+
+def _new_report(
+    anonymous_user_id: str,
+    category: str,
+    description: str,
+    location: dict,
+    address_reference: str,
+    media: list,
+    client_key: str = None,
+    owner_token_hash: str = None,
+    now: datetime = None
+) -> dict:
+    """Documento de un reporte nuevo (sin _id)"""
+    now = now or datetime.utcnow()
+    report_data = {
+        "anonymousUserId": anonymous_user_id,
+        "category": category,
+        "description": description,
+        "location": location,
+        "geohash": report_geohash(location),
+        "addressReference": address_reference,
+        "media": media,
+        "status": "pending",
+        "createdAt": now,
+        "updatedAt": now
+    }
+    if client_key:
+        # Solo se guarda si viene: el índice único es parcial sobre clientKey
+        report_data["clientKey"] = client_key
+    if owner_token_hash:
+        report_data["ownerTokenHash"] = owner_token_hash
+    return report_data
+
+
+async def get_report_by_client_key(anonymous_user_id: str, client_key: str):
+    return await reports_collection.find_one({"anonymousUserId": anonymous_user_id, "clientKey": client_key})
+
+
+async def create_report(
+    anonymous_user_id: str,
+    category: str,
+    description: str,
+    location: dict,
+    address_reference: str,
+    media: list,
+    client_key: str = None,
+    owner_token_hash: str = None
+) -> tuple:
+    """
+    Crea un reporte y retorna (reporte, created). Si client_key ya se usó para
+    ese usuario (reintento del cliente) retorna el reporte existente con
+    created=False, sin crear otro.
+    """
+    report_data = _new_report(
+        anonymous_user_id, category, description, location, address_reference, media, client_key,
+        owner_token_hash
+    )
+    now = report_data["createdAt"]
+
+    for attempt in range(REPORT_ID_ATTEMPTS):
+        report_data["_id"] = generate_report_id(now)
+        try:
+            await reports_collection.insert_one(report_data)
+            break
+        except DuplicateKeyError as e:
+            if _conflict_field(e.details) == "clientKey":
+                existing = await get_report_by_client_key(anonymous_user_id, client_key)
+                if existing:
+                    return existing, False
+                raise
+            if attempt == REPORT_ID_ATTEMPTS - 1:
+                raise
+
+    await stats_collection.bulk_write([bucket_inc(now, category, "pending", 1)])
+    return report_data, True
+
+
+async def create_reports_bulk(reports: list) -> list:
+    """
+    Crea varios reportes con un insert_many sin orden: un error en un reporte
+    no detiene a los demás. Cada elemento de reports tiene los argumentos de
+    create_report.
+
+    Retorna una lista paralela de (status, reporte, error) con status:
+    - "created": reporte insertado
+    - "duplicate": client_key ya usado por ese usuario; reporte es el existente
+    - "failed": documento inválido o error de MongoDB (reporte es None)
+    """
+    now = datetime.utcnow()
+    docs = [None] * len(reports)
+    results = [None] * len(reports)
+    duplicates = []
+
+    pending = []
+    for index, report in enumerate(reports):
+        # Un documento que no se puede armar (p. ej. ubicación sin geohash)
+        # falla solo, sin tumbar el resto del lote
+        try:
+            docs[index] = _new_report(**report, now=now)
+        except (ValueError, TypeError, KeyError) as e:
+            results[index] = ("failed", None, f"Reporte inválido: {e}")
+            continue
+        pending.append(index)
+
+    for attempt in range(REPORT_ID_ATTEMPTS):
+        if not pending:
+            break
+        for index in pending:
+            docs[index]["_id"] = generate_report_id(now)
+        try:
+            await reports_collection.insert_many([docs[index] for index in pending], ordered=False)
+            errors = []
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+
+        retry = []
+        for error in errors:
+            # error["index"] es la posición dentro de este insert_many
+            index = pending[error["index"]]
+            if error.get("code") == 11000 and _conflict_field(error) == "clientKey":
+                duplicates.append(index)
+            elif error.get("code") == 11000 and attempt < REPORT_ID_ATTEMPTS - 1:
+                retry.append(index)
+            else:
+                results[index] = ("failed", None, error.get("errmsg", "Error al insertar"))
+        not_created = set(retry) | set(duplicates) | {i for i in pending if results[i]}
+        for index in pending:
+            if index not in not_created:
+                results[index] = ("created", docs[index], None)
+        pending = retry
+
+    if duplicates:
+        # Una sola consulta para todos los reintentos (incluye claves repetidas
+        # dentro del mismo lote, que ya quedaron insertadas arriba)
+        keys = [{"anonymousUserId": docs[i]["anonymousUserId"], "clientKey": docs[i]["clientKey"]} for i in duplicates]
+        existing = {}
+        async for report in reports_collection.find({"$or": keys}):
+            existing[(report["anonymousUserId"], report["clientKey"])] = report
+        for index in duplicates:
+            report = existing.get((docs[index]["anonymousUserId"], docs[index]["clientKey"]))
+            if report:
+                results[index] = ("duplicate", report, None)
+            else:
+                results[index] = ("failed", None, "Clave de cliente en conflicto")
+
+    created_by_category = {}
+    for status, report, _ in results:
+        if status == "created":
+            created_by_category[report["category"]] = created_by_category.get(report["category"], 0) + 1
+    if created_by_category:
+        await stats_collection.bulk_write([
+            bucket_inc(now, category, "pending", count) for category, count in created_by_category.items()
+        ])
+
+    return results
+
+
+async def get_report_by_id(report_id: str):
+    return await reports_collection.find_one({"_id": report_id})
+
+
+async def get_reports_by_user(anonymous_user_id: str, cursor: str = None, limit: int = 50):
+    return await fetch_page(
+        reports_collection,
+        {"anonymousUserId": anonymous_user_id},
+        cursor=cursor,
+        limit=limit
+    )
+
+
+async def get_all_reports(query: dict = None, cursor: str = None, limit: int = 50):
+    return await fetch_page(reports_collection, query or {}, cursor=cursor, limit=limit)
+
+
+def build_report_filter(
+    statuses: list = None,
+    categories: list = None,
+    anonymous_user_id: str = None,
+    created_from: datetime = None,
+    created_to: datetime = None,
+    updated_from: datetime = None,
+    updated_to: datetime = None
+) -> dict:
+    """Construye el filtro de MongoDB para los listados de reportes"""
+    query = {}
+    if anonymous_user_id:
+        query["anonymousUserId"] = anonymous_user_id
+    if statuses:
+        query["status"] = {"$in": list(statuses)}
+    if categories:
+        query["category"] = {"$in": list(categories)}
+
+    for field, start, end in (
+        ("createdAt", created_from, created_to),
+        ("updatedAt", updated_from, updated_to)
+    ):
+        date_range = {}
+        if start:
+            date_range["$gte"] = start
+        if end:
+            date_range["$lt"] = end
+        if date_range:
+            query[field] = date_range
+
+    return query
+
+
+async def get_reports_near(
+    lng: float,
+    lat: float,
+    radius: float,
+    query: dict,
+    cursor: str = None,
+    limit: int = 50
+):
+    """
+    Reportes dentro de un radio (metros), del más cercano al más lejano.
+    Cada reporte incluye `distance` en metros. Retorna (reportes, next_cursor).
+    """
+    geo_near = {
+        "near": {"type": "Point", "coordinates": [lng, lat]},
+        "distanceField": "distance",
+        "maxDistance": radius,
+        "query": query,
+        "spherical": True,
+        "key": "location"
+    }
+    pipeline = [{"$geoNear": geo_near}]
+
+    if cursor:
+        last_distance, last_id = decode_distance_cursor(cursor)
+        geo_near["minDistance"] = last_distance
+        pipeline.append({"$match": {
+            "$or": [
+                {"distance": {"$gt": last_distance}},
+                {"distance": last_distance, "_id": {"$gt": last_id}}
+            ]
+        }})
+
+    pipeline += [
+        {"$sort": {"distance": 1, "_id": 1}},
+        {"$limit": limit + 1}
+    ]
+
+    docs = await reports_collection.aggregate(pipeline).to_list(length=limit + 1)
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_distance_cursor(docs[-1])
+
+    return docs, next_cursor
+
+
+async def get_reports_within(geometry: dict, query: dict, cursor: str = None, limit: int = 50):
+    """Reportes dentro de un polígono GeoJSON, más recientes primero"""
+    geo_query = {**query, "location": {"$geoWithin": {"$geometry": geometry}}}
+    return await fetch_page(reports_collection, geo_query, cursor=cursor, limit=limit)
+
+
+# Campos públicos de un reporte (los de format_report_response): sin clientKey,
+# ownerTokenHash, geohash ni statusHistory (IDs de administradores)
+REPORT_PUBLIC_PROJECTION = {
+    "anonymousUserId": 1,
+    "category": 1,
+    "description": 1,
+    "location": 1,
+    "addressReference": 1,
+    "media": 1,
+    "status": 1,
+    "createdAt": 1,
+    "updatedAt": 1
+}
+
+
+def iter_reports(query: dict, batch_size: int):
+    """Cursor de reportes (más recientes primero) para recorrer sin cargar todo en memoria"""
+    return (
+        reports_collection
+        .find(query, REPORT_PUBLIC_PROJECTION)
+        .sort(REPORTS_SORT)
+        .batch_size(batch_size)
+    )
+
+
+async def get_report_heatmap(precision: int, query: dict, max_cells: int):
+    """Cantidad de reportes por celda geohash de la precisión dada"""
+    pipeline = heatmap_pipeline(precision, query, max_cells)
+    return await reports_collection.aggregate(pipeline).to_list(length=max_cells)
+
+
+def _status_update(status: str, by: str, now: datetime, entry_id: str = None) -> dict:
+    """Cambio de estado con su entrada en statusHistory (se guardan las últimas N)"""
+    return {
+        "$set": {"status": status, "updatedAt": now},
+        "$push": {"statusHistory": {
+            "$each": [{"id": entry_id or new_ulid(), "status": status, "at": now, "by": by}],
+            "$slice": -settings.REPORTS_STATUS_HISTORY_MAX
+        }}
+    }
+
+
+def _utcnow_ms() -> datetime:
+    # MongoDB guarda milisegundos; se trunca para que la respuesta coincida
+    now = datetime.utcnow()
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+
+async def update_report_status(report_id: str, status: str, by: str = None):
+    try:
+        now = _utcnow_ms()
+        before = await reports_collection.find_one_and_update(
+            {"_id": report_id},
+            _status_update(status, by, now),
+            projection={"statusHistory": 0},
+            return_document=ReturnDocument.BEFORE
+        )
+        if not before:
+            return None
+
+        ops = status_change_ops(before, status)
+        if ops:
+            await stats_collection.bulk_write(ops, ordered=False)
+
+        return {**before, "status": status, "updatedAt": now}
+    except Exception:
+        return None
+
+
+async def update_reports_status(updates: list, by: str) -> list:
+    """
+    Aplica varios cambios de estado [(report_id, status)] con un solo bulk_write.
+
+    Cada update exige que el reporte siga en el estado leído antes, así los
+    rollups de estadísticas se mueven del bucket correcto. Retorna una lista
+    paralela de (resultado, reporte) con resultado:
+    - "updated": reporte actualizado
+    - "not_found": el reporte no existe
+    - "conflict": otro cambio de estado llegó entre la lectura y la escritura
+    """
+    now = _utcnow_ms()
+    ids = [report_id for report_id, _ in updates]
+    before = {}
+    async for report in reports_collection.find({"_id": {"$in": ids}}, {"statusHistory": 0, "geohash": 0}):
+        before[report["_id"]] = report
+
+    # Cada entrada del historial lleva su propio ID para reconocer después qué
+    # updates se aplicaron (at y by pueden repetirse entre solicitudes)
+    entry_ids = {report_id: new_ulid() for report_id, _ in updates if report_id in before}
+    ops = [
+        UpdateOne(
+            {"_id": report_id, "status": before[report_id]["status"]},
+            _status_update(status, by, now, entry_ids[report_id])
+        )
+        for report_id, status in updates
+        if report_id in before
+    ]
+    applied = set(before)
+    if ops:
+        result = await reports_collection.bulk_write(ops, ordered=False)
+        if result.matched_count < len(ops):
+            # BulkWriteResult no dice cuáles fallaron: se buscan los que llevan su entrada
+            applied = set()
+            async for report in reports_collection.find(
+                {"_id": {"$in": list(entry_ids)}, "statusHistory.id": {"$in": list(entry_ids.values())}},
+                {"_id": 1}
+            ):
+                applied.add(report["_id"])
+
+    results = []
+    stats_ops = []
+    for report_id, status in updates:
+        if report_id not in before:
+            results.append(("not_found", None))
+        elif report_id not in applied:
+            results.append(("conflict", None))
+        else:
+            stats_ops += status_change_ops(before[report_id], status)
+            results.append(("updated", {**before[report_id], "status": status, "updatedAt": now}))
+
+    if stats_ops:
+        await stats_collection.bulk_write(stats_ops, ordered=False)
+
+    return results
+
+
+async def get_report_status_history(report_id: str):
+    return await reports_collection.find_one({"_id": report_id}, {"status": 1, "statusHistory": 1})
+
+
+async def get_report_stats(date_from: datetime = None, date_to: datetime = None, query: dict = None):
+    """Buckets de estadísticas (día × categoría × estado) en el rango dado"""
+    stats_query = dict(query or {})
+    day_range = {}
+    if date_from:
+        day_range["$gte"] = date_from
+    if date_to:
+        day_range["$lt"] = date_to
+    if day_range:
+        stats_query["day"] = day_range
+
+    cursor = stats_collection.find(stats_query, {"_id": 0, "day": 1, "category": 1, "status": 1, "count": 1})
+    return await cursor.to_list(length=None)
+
+
+# ===== FUNCIONES CHAT =====
+
+async def get_legacy_document_contents():
+    """Documentos cargados antes del guardado por páginas (tienen el texto en `content`)"""
+    cursor = documents_collection.find(
+        {"storage": {"$exists": False}},
+        {"document_id": 1, "file_name": 1, "content": 1}
+    )
+    return await cursor.to_list(length=None)
+
+
+async def get_all_document_pages():
+    """Páginas (texto comprimido) de los documentos cuya carga terminó"""
+    # La fila en `documents` se inserta al final de la carga: marca el documento como listo
+    ready_ids = await documents_collection.distinct("document_id", {"storage": "pages"})
+    cursor = document_pages_collection.find(
+        {"document_id": {"$in": ready_ids}},
+        {"_id": 0, "document_id": 1, "file_name": 1, "page": 1, "text": 1}
+    )
+    return await cursor.to_list(length=None)
+
+
+async def get_document_by_hash(content_hash: str):
+    return await documents_collection.find_one(
+        {"content_hash": content_hash},
+        {"_id": 0, "document_id": 1, "file_name": 1}
+    )
+
+
+async def insert_document_pages(document_id: str, file_name: str, pages: list):
+    """Guarda un lote de páginas de un documento (aún no visible para el chat)"""
+    if not pages:
+        return
+    await document_pages_collection.insert_many([
+        {
+            "document_id": document_id,
+            "file_name": file_name,
+            "page": page["page"],
+            "text": page["text"]
+        }
+        for page in pages
+    ], ordered=False)
+
+
+async def delete_document_pages(document_id: str):
+    await document_pages_collection.delete_many({"document_id": document_id})
+
+
+async def store_original_pdf(path: str, file_name: str, content_hash: str):
+    """Sube el PDF original a GridFS y retorna su id"""
+    with open(path, "rb") as source:
+        return await pdf_bucket.upload_from_stream(
+            file_name,
+            source,
+            metadata={"content_hash": content_hash, "content_type": "application/pdf"}
+        )
+
+
+async def delete_original_pdf(file_id):
+    await pdf_bucket.delete(file_id)
+
+
+async def create_document(
+    document_id: str,
+    file_name: str,
+    content_hash: str,
+    file_id,
+    page_count: int,
+    size_bytes: int,
+    text_bytes: int,
+    stored_bytes: int
+):
+    """
+    Registra un documento ya guardado por páginas; desde aquí el chat lo puede usar.
+    Lanza DuplicateKeyError si ya existe un documento con el mismo content_hash.
+    """
+    await documents_collection.insert_one({
+        "document_id": document_id,
+        "file_name": file_name,
+        "content_hash": content_hash,
+        "file_id": file_id,
+        "storage": "pages",
+        "page_count": page_count,
+        "size_bytes": size_bytes,
+        "text_bytes": text_bytes,
+        "stored_bytes": stored_bytes,
+        "uploaded_at": datetime.utcnow()
+    })
+
+
+ACTIVE_INGESTION_STATUSES = ["queued", "parsing", "storing"]
+
+
+async def create_ingestion_job(job_id: str, document_id: str, file_name: str, content_hash: str, temp_path: str = None):
+    now = datetime.utcnow()
+    job = {
+        "_id": job_id,
+        "document_id": document_id,
+        "file_name": file_name,
+        "content_hash": content_hash,
+        "temp_path": temp_path,
+        "status": "queued",
+        "pages_total": None,
+        "pages_parsed": 0,
+        "pages_stored": 0,
+        "text_bytes": 0,
+        "stored_bytes": 0,
+        "errors": [],
+        "created_at": now,
+        "updated_at": now,
+        "finished_at": None
+    }
+    await ingestion_jobs_collection.insert_one(job)
+    return job
+
+
+async def update_ingestion_job(job_id: str, set_fields: dict = None, inc: dict = None, error: str = None):
+    """Actualiza el estado/progreso de una carga en una sola escritura"""
+    update = {"$set": {**(set_fields or {}), "updated_at": datetime.utcnow()}}
+    if inc:
+        update["$inc"] = inc
+    if error:
+        update["$push"] = {"errors": error}
+    await ingestion_jobs_collection.update_one({"_id": job_id}, update)
+
+
+async def get_ingestion_job(job_id: str):
+    return await ingestion_jobs_collection.find_one({"_id": job_id})
+
+
+def _stale_cutoff() -> datetime:
+    return datetime.utcnow() - timedelta(seconds=settings.INGEST_JOB_STALE_SECONDS)
+
+
+async def get_active_ingestion_job(content_hash: str):
+    """
+    Carga en curso del mismo PDF, si la hay. Las cargas en curso actualizan
+    updated_at periódicamente; una sin avances recientes murió con su worker
+    y no cuenta (ver fail_stale_ingestion_jobs).
+    """
+    return await ingestion_jobs_collection.find_one({
+        "content_hash": content_hash,
+        "status": {"$in": ACTIVE_INGESTION_STATUSES},
+        "updated_at": {"$gte": _stale_cutoff()}
+    })
+
+
+async def fail_stale_ingestion_jobs(content_hash: str) -> list:
+    """
+    Marca como fallidas las cargas de ese PDF que quedaron en curso tras un
+    reinicio o deploy. Retorna las rutas de sus archivos temporales.
+    """
+    query = {
+        "content_hash": content_hash,
+        "status": {"$in": ACTIVE_INGESTION_STATUSES},
+        "updated_at": {"$lt": _stale_cutoff()}
+    }
+    stale = await ingestion_jobs_collection.find(query, {"temp_path": 1}).to_list(length=None)
+    if not stale:
+        return []
+    now = datetime.utcnow()
+    await ingestion_jobs_collection.update_many(
+        {**query, "_id": {"$in": [job["_id"] for job in stale]}},
+        {
+            "$set": {"status": "failed", "finished_at": now, "updated_at": now},
+            "$push": {"errors": "Carga interrumpida: el worker se detuvo antes de terminar"}
+        }
+    )
+    return [job["temp_path"] for job in stale if job.get("temp_path")]
+
+
+async def get_corpus_version() -> int:
+    """Versión actual del corpus de documentos (0 si nunca se cargó uno)"""
+    state = await corpus_state_collection.find_one({"_id": "corpus"}, {"version": 1})
+    return state["version"] if state else 0
+
+
+async def bump_corpus_version() -> int:
+    """Incrementa la versión del corpus para que todos los workers lo recarguen"""
+    state = await corpus_state_collection.find_one_and_update(
+        {"_id": "corpus"},
+        {"$inc": {"version": 1}, "$set": {"updated_at": datetime.utcnow()}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return state["version"]
+
+
+async def save_message(session_id, role, content):
+    """Guarda un mensaje en el historial de una sesión"""
+    await chat_history_collection.insert_one({
+        "session_id": session_id,
+        "role": role,
+        "content": content,
+        "timestamp": datetime.utcnow()
+    })
+
+
+async def save_turn(session_id, user_message, answer):
+    """Guarda la pregunta y la respuesta de un turno en una sola escritura"""
+    now = datetime.utcnow()
+    await chat_history_collection.insert_many([
+        {"session_id": session_id, "role": "user", "content": user_message, "timestamp": now},
+        # +1 ms para conservar el orden con la precisión de MongoDB
+        {"session_id": session_id, "role": "assistant", "content": answer, "timestamp": now + timedelta(milliseconds=1)}
+    ], ordered=True)
+
+
+async def get_history(session_id, limit=5):
+    """Obtiene el historial reciente de una sesión"""
+    cursor = chat_history_collection.find(
+        {"session_id": session_id},
+        {"_id": 0, "role": 1, "content": 1}
+    ).sort("timestamp", -1).limit(limit)
+    history = await cursor.to_list(length=limit)
+    return history[::-1]
+
+
+# ===== FUNCIONES MEDIA =====
+
+def _media_hash_id(content_hash: str, backend: str) -> str:
+    # Un registro por almacenamiento: al cambiar de backend el mismo archivo se vuelve a registrar
+    return f"{backend}:{content_hash}"
+
+
+async def get_media_by_hash(content_hash: str, backend: str):
+    """Archivo ya subido con el mismo SHA-256 al mismo almacenamiento"""
+    return await media_hashes_collection.find_one({"_id": _media_hash_id(content_hash, backend)})
+
+
+async def save_media_hash(content_hash: str, backend: str, resource_type: str, upload_result: dict):
+    try:
+        await media_hashes_collection.insert_one({
+            "_id": _media_hash_id(content_hash, backend),
+            "content_hash": content_hash,
+            "backend": backend,
+            "type": resource_type,
+            "url": upload_result["url"],
+            "public_id": upload_result["public_id"],
+            "format": upload_result["format"],
+            "bytes": upload_result["bytes"],
+            "created_at": datetime.utcnow()
+        })
+    except DuplicateKeyError:
+        # Otra solicitud subió el mismo archivo a la vez; se conserva el primero
+        pass
+
+
+async def create_upload_grant(grant: dict):
+    await upload_grants_collection.insert_one(grant)
+
+
+async def get_upload_grant(grant_id: str):
+    return await upload_grants_collection.find_one({"_id": grant_id})
+
+
+async def finish_upload_grant(grant_id: str, status: str, asset: dict = None, error: str = None):
+    """
+    Cierra un permiso de subida pendiente. Retorna el permiso actualizado o
+    None si ya estaba cerrado (los avisos repetidos no se procesan dos veces).
+    """
+    return await upload_grants_collection.find_one_and_update(
+        {"_id": grant_id, "status": "pending"},
+        {"$set": {
+            "status": status,
+            "asset": asset,
+            "error": error,
+            "finished_at": datetime.utcnow()
+        }},
+        return_document=ReturnDocument.AFTER
+    )
+
+
+async def add_report_media(report_id: str, owner_token_hash: str, media_item: dict) -> bool:
+    """Agrega un archivo al reporte solo si owner_token_hash es el del dueño"""
+    if not owner_token_hash:
+        return False
+    result = await reports_collection.update_one(
+        {"_id": report_id, "ownerTokenHash": owner_token_hash},
+        {"$push": {"media": media_item}, "$set": {"updatedAt": datetime.utcnow()}}
+    )
+    return result.matched_count > 0
+
+
+def close_connection():
+    client.close()
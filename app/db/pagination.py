@@ -0,0 +1,87 @@
+# ARCHIVO: secure-report-back/app/db/pagination.py
+
+import base64
+import json
+from datetime import datetime
+
+# Orden estable para listados: más recientes primero, _id como desempate
+REPORTS_SORT = [("createdAt", -1), ("_id", -1)]
+
+
+def _encode(payload: dict) -> str:
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode(cursor: str) -> dict:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    return json.loads(base64.urlsafe_b64decode(padded.encode()))
+
+
+def encode_cursor(report: dict) -> str:
+    """Genera un cursor opaco a partir del último reporte de la página"""
+    return _encode({
+        "c": report["createdAt"].isoformat(),
+        "i": str(report["_id"])
+    })
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """Decodifica un cursor opaco. Lanza ValueError si es inválido"""
+    try:
+        payload = _decode(cursor)
+        return datetime.fromisoformat(payload["c"]), payload["i"]
+    except Exception as e:
+        raise ValueError("Cursor inválido") from e
+
+
+def encode_distance_cursor(report: dict) -> str:
+    """Cursor para resultados ordenados por distancia ($geoNear)"""
+    return _encode({
+        "d": report["distance"],
+        "i": str(report["_id"])
+    })
+
+
+def decode_distance_cursor(cursor: str) -> tuple:
+    """Decodifica un cursor de distancia. Lanza ValueError si es inválido"""
+    try:
+        payload = _decode(cursor)
+        return float(payload["d"]), payload["i"]
+    except Exception as e:
+        raise ValueError("Cursor inválido") from e
+
+
+def keyset_filter(cursor: str) -> dict:
+    """Filtro para continuar después del cursor según REPORTS_SORT"""
+    created_at, report_id = decode_cursor(cursor)
+    return {
+        "$or": [
+            {"createdAt": {"$lt": created_at}},
+            {"createdAt": created_at, "_id": {"$lt": report_id}}
+        ]
+    }
+
+
+async def fetch_page(collection, query: dict, cursor: str = None, limit: int = 50):
+    """
+    Obtiene una página de reportes ordenada por REPORTS_SORT.
+    Retorna (reportes, next_cursor); next_cursor es None en la última página.
+    """
+    if cursor:
+        query = {"$and": [query, keyset_filter(cursor)]} if query else keyset_filter(cursor)
+
+    docs = await (
+        collection
+        .find(query)
+        .sort(REPORTS_SORT)
+        .limit(limit + 1)
+        .to_list(length=limit + 1)
+    )
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1])
+
+    return docs, next_cursor
@@ -0,0 +1,122 @@
+# ARCHIVO: secure-report-back/app/db/stats.py
+"""
+Rollups de estadísticas de reportes: un bucket por día × categoría × estado.
+
+create_report(s_bulk) y update_report(s)_status mantienen los buckets con $inc.
+Después de un backfill o una importación directa en MongoDB se pueden
+recalcular desde cero:
+
+    python -m app.db.stats rebuild
+"""
+
+import sys
+from datetime import datetime
+from pymongo import UpdateOne
+
+STATS_COLLECTION = "report_stats"
+
+
+def bucket_day(created_at: datetime) -> datetime:
+    """Día (UTC, a medianoche) al que pertenece un reporte"""
+    return datetime(created_at.year, created_at.month, created_at.day)
+
+
+def bucket_id(day: datetime, category: str, status: str) -> str:
+    return f"{day:%Y-%m-%d}|{category}|{status}"
+
+
+def bucket_inc(created_at: datetime, category: str, status: str, amount: int) -> UpdateOne:
+    """Operación $inc sobre el bucket de un reporte"""
+    day = bucket_day(created_at)
+    return UpdateOne(
+        {"_id": bucket_id(day, category, status)},
+        {
+            "$inc": {"count": amount},
+            "$setOnInsert": {"day": day, "category": category, "status": status}
+        },
+        upsert=True
+    )
+
+
+def status_change_ops(report: dict, new_status: str) -> list:
+    """Operaciones para mover un reporte de su bucket de estado actual al nuevo"""
+    if report["status"] == new_status:
+        return []
+    return [
+        bucket_inc(report["createdAt"], report["category"], report["status"], -1),
+        bucket_inc(report["createdAt"], report["category"], new_status, 1)
+    ]
+
+
+def summarize_buckets(buckets: list) -> dict:
+    """Agrega buckets en totales por categoría, estado y día"""
+    by_category = {}
+    by_status = {}
+    by_day = {}
+    total = 0
+
+    for bucket in buckets:
+        count = bucket["count"]
+        if count <= 0:
+            continue
+        total += count
+        by_category[bucket["category"]] = by_category.get(bucket["category"], 0) + count
+        by_status[bucket["status"]] = by_status.get(bucket["status"], 0) + count
+        day = bucket["day"].date()
+        by_day[day] = by_day.get(day, 0) + count
+
+    return {
+        "total": total,
+        "by_category": by_category,
+        "by_status": by_status,
+        "by_day": [{"day": day, "count": by_day[day]} for day in sorted(by_day)]
+    }
+
+
+# Recalcula todos los buckets a partir de la colección de reportes
+REBUILD_PIPELINE = [
+    {"$group": {
+        "_id": {
+            "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$createdAt"}},
+            "category": "$category",
+            "status": "$status"
+        },
+        "count": {"$sum": 1}
+    }},
+    {"$project": {
+        "_id": {"$concat": ["$_id.day", "|", "$_id.category", "|", "$_id.status"]},
+        "day": {"$dateFromString": {"dateString": "$_id.day", "format": "%Y-%m-%d"}},
+        "category": "$_id.category",
+        "status": "$_id.status",
+        "count": 1
+    }},
+    {"$out": STATS_COLLECTION}
+]
+
+
+def rebuild(db):
+    """
+    Reemplaza la colección de rollups con un recálculo completo.
+    $out reemplaza la colección de forma atómica, pero los $inc que lleguen
+    durante el recálculo se pierden: ejecutar en un momento de poco tráfico.
+    """
+    db["reports"].aggregate(REBUILD_PIPELINE, allowDiskUse=True)
+    from app.db.indexes import INDEXES
+    db[STATS_COLLECTION].create_indexes(INDEXES[STATS_COLLECTION])
+    total = db[STATS_COLLECTION].count_documents({})
+    print(f"> {STATS_COLLECTION} recalculada: {total} buckets")
+
+
+def main(argv):
+    command = argv[1] if len(argv) > 1 else ""
+    if command != "rebuild":
+        print("Uso: python -m app.db.stats rebuild")
+        return 2
+
+    from app.db.mongo import db
+    rebuild(db)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -1,12 +1,49 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from datetime import datetime
 
 class ChatRequest(BaseModel):
     message: str
+    session_id: Optional[str] = Field(None, max_length=64, description="Sesión de /api/chat/session; si no se envía se crea una nueva")
+
+class TokenUsage(BaseModel):
+    system: int
+    history: int
+    context: int
+    question: int
+    total: int
+    history_messages: int
+    context_chunks: int
+    trimmed: bool
 
 class ChatResponse(BaseModel):
     respuesta: str
+    session_id: str
+    uso_tokens: Optional[TokenUsage] = Field(None, description="Tokens del prompt por sección (null si la respuesta vino de la caché)")
+
+class SessionResponse(BaseModel):
+    session_id: str
+    saludo: str
 
 class UploadResponse(BaseModel):
+    job_id: Optional[str] = Field(None, description="null si el PDF ya estaba cargado")
+    document_id: str
+    file_name: str
+    status: str
+    mensaje: str
+
+class IngestionJob(BaseModel):
+    job_id: str
     document_id: str
     file_name: str
-    mensaje: str
\ No newline at end of file
+    content_hash: str
+    status: str = Field(..., description="queued, parsing, storing, completed, duplicate o failed")
+    pages_total: Optional[int] = None
+    pages_parsed: int
+    pages_stored: int
+    text_bytes: int = Field(..., description="Tamaño del texto extraído")
+    stored_bytes: int = Field(..., description="Tamaño del texto comprimido guardado")
+    errors: List[str]
+    created_at: datetime
+    updated_at: datetime
+    finished_at: Optional[datetime] = None
\ No newline at end of file
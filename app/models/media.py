@@ -0,0 +1,35 @@
+# ARCHIVO: secure-report-back/app/models/media.py
+
+from pydantic import BaseModel, Field
+from typing import Any, Dict, Literal, Optional
+from datetime import datetime
+
+class UploadGrantRequest(BaseModel):
+    resource_type: Literal["image", "video"]
+    report_id: Optional[str] = Field(None, description="Reporte al que se agrega el archivo al completar la subida")
+    ownerToken: Optional[str] = Field(None, description="Secreto del dueño (ownerToken al crear el reporte); obligatorio si se envía report_id")
+    max_bytes: Optional[int] = Field(None, gt=0, description="Tamaño máximo del archivo; por defecto el máximo del servidor")
+
+class UploadGrant(BaseModel):
+    grant_id: str
+    public_id: str
+    resource_type: str
+    max_bytes: int
+    expires_at: datetime
+    upload_url: str = Field(..., description="URL a la que el cliente sube el archivo (multipart/form-data)")
+    fields: Dict[str, Any] = Field(..., description="Campos firmados que se envían junto con `file`")
+
+class UploadedAsset(BaseModel):
+    type: str
+    url: str
+    public_id: str
+    format: Optional[str] = None
+    size: int
+
+class UploadGrantStatus(BaseModel):
+    grant_id: str
+    status: str = Field(..., description="pending, completed o rejected")
+    report_id: Optional[str] = None
+    expires_at: datetime
+    asset: Optional[UploadedAsset] = None
+    error: Optional[str] = None
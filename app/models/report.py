@@ -1,8 +1,8 @@
 # ARCHIVO: secure-report-back/app/models/report.py
 
-from pydantic import BaseModel, Field
-from typing import List, Optional, Literal
-from datetime import datetime
+from pydantic import BaseModel, Field, field_validator
+from typing import Any, Dict, List, Optional, Literal
+from datetime import date, datetime
 from enum import Enum
 
 
@@ -31,6 +31,35 @@ class LocationPoint(BaseModel):
     type: Literal["Point"] = "Point"
     coordinates: List[float] = Field(..., description="[longitud, latitud]")
 
+    @field_validator("coordinates")
+    @classmethod
+    def validar_coordenadas(cls, coordenadas):
+        if len(coordenadas) != 2:
+            raise ValueError("Las coordenadas deben ser [longitud, latitud]")
+        lng, lat = coordenadas
+        if not (-180 <= lng <= 180 and -90 <= lat <= 90):
+            raise ValueError("Coordenadas fuera de rango [longitud, latitud]")
+        return coordenadas
+
+
+class PolygonGeometry(BaseModel):
+    """Modelo para polígonos GeoJSON"""
+    type: Literal["Polygon"] = "Polygon"
+    coordinates: List[List[List[float]]] = Field(..., description="Anillos de [longitud, latitud]")
+
+    @field_validator("coordinates")
+    @classmethod
+    def validar_anillos(cls, anillos):
+        if not anillos:
+            raise ValueError("El polígono debe tener al menos un anillo")
+        for anillo in anillos:
+            if len(anillo) < 4 or anillo[0] != anillo[-1]:
+                raise ValueError("Cada anillo debe tener al menos 4 puntos y estar cerrado")
+            for punto in anillo:
+                if len(punto) != 2 or not (-180 <= punto[0] <= 180 and -90 <= punto[1] <= 90):
+                    raise ValueError("Coordenadas fuera de rango [longitud, latitud]")
+        return anillos
+
 
 class MediaItem(BaseModel):
     """Modelo para archivos multimedia"""
@@ -50,7 +79,12 @@ class ReportBase(BaseModel):
 
 class ReportCreate(ReportBase):
     """Modelo para crear un reporte (request)"""
-    pass
+    clientKey: Optional[str] = Field(
+        None,
+        min_length=1,
+        max_length=100,
+        description="Clave única generada por el cliente; reenviar el mismo reporte con la misma clave no crea un duplicado"
+    )
 
 
 class ReportUpdate(BaseModel):
@@ -75,7 +109,7 @@ class ReportInDB(ReportBase):
         populate_by_name = True
         json_schema_extra = {
             "example": {
-                "_id": "rep_98a21f",
+                "_id": "rep_01KFZEAM809YG81R4X4Y97K5A6",
                 "anonymousUserId": "anon_7f93a2c1",
                 "category": "acoso",
                 "description": "Persona del establecimiento realizó comentarios y gestos de naturaleza sexual y/o intimidatoria hacia el denunciante.",
@@ -87,7 +121,7 @@ class ReportInDB(ReportBase):
                 "media": [
                     {
                         "type": "image",
-                        "url": "https://cdn.app.com/reports/rep_98a21f/img1.jpg"
+                        "url": "https://cdn.app.com/reports/rep_01KFZEAM809YG81R4X4Y97K5A6/img1.jpg"
                     }
                 ],
                 "status": "pending",
@@ -112,3 +146,119 @@ class ReportResponse(BaseModel):
 
     class Config:
         populate_by_name = True
+
+
+class ReportCreated(ReportResponse):
+    """Respuesta al crear un reporte"""
+    ownerToken: Optional[str] = Field(
+        None,
+        description="Secreto del dueño para agregar archivos después; se entrega solo al crearlo (null en un reenvío con clientKey)"
+    )
+
+
+class ReportPage(BaseModel):
+    """Página de reportes con cursor para la siguiente"""
+    items: List[ReportResponse]
+    next_cursor: Optional[str] = None
+
+
+class ReportNearResponse(ReportResponse):
+    """Reporte con distancia al punto consultado"""
+    distance: float = Field(..., description="Distancia en metros")
+
+
+class ReportNearPage(BaseModel):
+    """Página de reportes cercanos con cursor para la siguiente"""
+    items: List[ReportNearResponse]
+    next_cursor: Optional[str] = None
+
+
+class DailyCount(BaseModel):
+    """Cantidad de reportes creados en un día"""
+    day: date
+    count: int
+
+
+class ReportStats(BaseModel):
+    """Estadísticas agregadas de reportes"""
+    total: int
+    by_category: Dict[str, int]
+    by_status: Dict[str, int]
+    by_day: List[DailyCount]
+
+
+class HeatmapCell(BaseModel):
+    """Celda geohash con la cantidad de reportes"""
+    cell: str
+    count: int
+    lat: float = Field(..., description="Latitud del centro de la celda")
+    lng: float = Field(..., description="Longitud del centro de la celda")
+
+
+class Heatmap(BaseModel):
+    """Mapa de calor de reportes agregados por celda"""
+    precision: int
+    cells: List[HeatmapCell]
+
+
+class ReportBulkCreate(BaseModel):
+    """Lote de reportes (cola offline de la app). Cada elemento se valida por separado"""
+    reports: List[Any] = Field(..., min_length=1, description="Elementos con el formato de ReportCreate")
+
+
+class ReportBulkItem(BaseModel):
+    """Resultado de un elemento del lote"""
+    index: int
+    clientKey: Optional[str] = None
+    status: Literal["created", "duplicate", "invalid", "failed"]
+    report: Optional[ReportResponse] = None
+    ownerToken: Optional[str] = Field(None, description="Solo en los reportes creados en esta solicitud")
+    error: Optional[str] = None
+
+
+class ReportBulkResponse(BaseModel):
+    """Resultado de la creación en lote"""
+    created: int
+    duplicates: int
+    failed: int
+    results: List[ReportBulkItem]
+
+
+class StatusChange(BaseModel):
+    """Cambio de estado de un reporte dentro de un lote"""
+    reportId: str
+    status: ReportStatus
+
+
+class ReportBulkStatusUpdate(BaseModel):
+    """Cambios de estado en lote (triage de moderación)"""
+    updates: List[StatusChange] = Field(..., min_length=1)
+
+
+class ReportBulkStatusItem(BaseModel):
+    """Resultado de un cambio de estado del lote"""
+    reportId: str
+    result: Literal["updated", "not_found", "conflict"]
+    report: Optional[ReportResponse] = None
+
+
+class ReportBulkStatusResponse(BaseModel):
+    """Resultado del cambio de estado en lote"""
+    updated: int
+    failed: int
+    results: List[ReportBulkStatusItem]
+
+
+class StatusHistoryEntry(BaseModel):
+    """Entrada del historial de estados"""
+    id: Optional[str] = Field(None, description="ID de la entrada (no existe en entradas antiguas)")
+    status: ReportStatus
+    at: datetime
+    by: Optional[str] = Field(None, description="ID del administrador que hizo el cambio")
+
+
+class ReportStatusHistory(BaseModel):
+    """Estado actual y últimos cambios de estado de un reporte"""
+    reportId: str
+    status: ReportStatus
+    history: List[StatusHistoryEntry]
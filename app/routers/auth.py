@@ -1,45 +1,37 @@
 # ARCHIVO: secure-report-back/app/routers/auth.py
 
-from fastapi import APIRouter, HTTPException, status
+import hmac
+from fastapi import APIRouter, Header, HTTPException, status
 from app.models.user import RegisterRequest, LoginRequest, RegisterResponse, LoginResponse, ErrorResponse
-from app.db.mongo import get_user_by_email, create_user, get_user_by_id
+from app.db.mongo_async import get_user_by_email, create_user, get_user_by_id
+from app.core.security import hash_password, verify_password, create_access_token
 from app.core.config import settings
-from bcrypt import hashpw, checkpw, gensalt
-from jose import jwt
-from datetime import datetime, timedelta
 
 router = APIRouter()
 
-def hash_password(password: str) -> str:
-    """Hashea contraseña con bcrypt"""
-    return hashpw(password.encode(), gensalt()).decode()
-
-def verify_password(password: str, hashed: str) -> bool:
-    """Verifica contraseña contra hash"""
-    return checkpw(password.encode(), hashed.encode())
-
-def create_access_token(user_id: str) -> str:
-    """Crea JWT token"""
-    payload = {
-        "sub": user_id,
-        "exp": datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    }
-    return jwt.encode(payload, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
-
 @router.post("/register", response_model=RegisterResponse)
-async def register(request: RegisterRequest):
-    """Registra nuevo usuario"""
+async def register(request: RegisterRequest, x_admin_key: str = Header(...)):
+    """
+    Registra nuevo usuario administrador. Requiere la admin key: todo usuario
+    registrado tiene role "admin" y puede cambiar estados y exportar reportes.
+    """
+    
+    if not hmac.compare_digest(x_admin_key.encode(), settings.ADMIN_API_KEY.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail={"error": "Clave de admin inválida"}
+        )
     
-    existing_user = get_user_by_email(request.email)
+    existing_user = await get_user_by_email(request.email)
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail={"error": "El correo ya está registrado"}
         )
     
-    hashed_password = hash_password(request.password)
+    hashed_password = await hash_password(request.password)
     
-    user_id = create_user(
+    user_id = await create_user(
         nombre=request.nombre,
         apellido=request.apellido,
         fecha_nacimiento=request.fecha_nacimiento,
@@ -54,14 +46,14 @@ async def register(request: RegisterRequest):
 async def login(request: LoginRequest):
     """Login de usuario"""
     
-    user = get_user_by_email(request.email)
+    user = await get_user_by_email(request.email)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail={"error": "Credenciales inválidas"}
         )
     
-    if not verify_password(request.password, user["password"]):
+    if not await verify_password(request.password, user["password"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail={"error": "Credenciales inválidas"}
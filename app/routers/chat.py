@@ -1,18 +1,29 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Header, status
+from fastapi import APIRouter, UploadFile, File, HTTPException, Header, Response, status
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from urllib.parse import unquote
 from uuid import uuid4
-from datetime import datetime
-import time
-import fitz
-from openai import OpenAI
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+from openai import AsyncOpenAI
 from app.core.config import settings
-from app.db.mongo import db
-from app.models.chat import ChatRequest, ChatResponse, UploadResponse
+from app.db.mongo_async import (
+    save_message, save_turn, get_history, get_ingestion_job,
+    get_document_by_hash, get_active_ingestion_job, fail_stale_ingestion_jobs
+)
+from app.db.corpus import get_corpus_index, current_corpus_version
+from app.db.ingestion import start_ingestion
+from app.db.answer_cache import answer_cache
+from app.core.prompt import ensamblar_prompt
+from app.models.chat import ChatRequest, ChatResponse, SessionResponse, UploadResponse, IngestionJob
 
 router = APIRouter()
 
 # Configurar OpenAI
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
+client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
 
 SALUDO_INICIAL = "Hola, soy ChatSeguro. Estoy acá para escucharte y ayudarte con lo que necesites. Todo lo que me digas es privado y seguro. ¿En qué puedo apoyarte?"
 
@@ -72,142 +83,373 @@ def limpiar_respuesta(texto):
         texto = texto.replace("\n\n\n", "\n\n")
     return texto.strip()
 
-def save_message(document_id, role, content):
-    """Guarda un mensaje en el historial"""
-    db.chat_history.insert_one({
-        "document_id": document_id,
-        "role": role,
-        "content": content,
-        "timestamp": datetime.utcnow()
-    })
-
-def get_history(document_id, limit=5):
-    """Obtiene el historial reciente"""
-    history = list(
-        db.chat_history.find(
-            {"document_id": document_id},
-            {"_id": 0, "role": 1, "content": 1}
-        ).sort("timestamp", -1).limit(limit)
-    )
-    return history[::-1]
+class LimpiadorIncremental:
+    """
+    Aplica la misma limpieza que limpiar_respuesta a un texto que llega por partes.
+    Solo retiene lo necesario para decidir (espacios al final de la línea y saltos
+    de línea pendientes), así el texto limpio se puede enviar apenas llega.
+    """
+    
+    def __init__(self):
+        self.inicio_linea = True
+        self.guion_quitado = False
+        self.espacios = ""
+        self.saltos = 0
+        self.emitido = False
+    
+    def agregar(self, texto):
+        """Procesa un fragmento y retorna el texto limpio que ya se puede emitir"""
+        salida = []
+        for c in texto:
+            if c in "*#":
+                continue
+            if c == "\n":
+                self.espacios = ""
+                self.saltos += 1
+                self.inicio_linea = True
+                self.guion_quitado = False
+            elif self.inicio_linea:
+                if c.isspace():
+                    continue
+                if c == "-" and not self.guion_quitado:
+                    self.guion_quitado = True
+                    continue
+                if self.emitido:
+                    salida.append("\n" * min(self.saltos, 2))
+                self.saltos = 0
+                self.inicio_linea = False
+                self.emitido = True
+                salida.append(c)
+            elif c.isspace():
+                self.espacios += c
+            else:
+                salida.append(self.espacios + c)
+                self.espacios = ""
+        return "".join(salida)
+
+def verificar_admin(x_admin_key: str):
+    if x_admin_key != settings.ADMIN_API_KEY:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Clave de admin inválida"
+        )
 
-@router.post("/upload", response_model=UploadResponse, status_code=status.HTTP_201_CREATED)
-async def upload_document(file: UploadFile = File(...), x_admin_key: str = Header(...)):
+def guardar_temporal(origen) -> tuple:
+    """
+    Copia el archivo subido a un temporal en disco que el pool de procesos pueda
+    abrir, calculando el SHA-256 en la misma pasada. Retorna (ruta, hash).
     """
-    Sube un PDF y lo almacena en MongoDB
+    sha256 = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as destino:
+        while True:
+            bloque = origen.read(1024 * 1024)
+            if not bloque:
+                break
+            sha256.update(bloque)
+            destino.write(bloque)
+        return destino.name, sha256.hexdigest()
+
+@router.post("/upload", response_model=UploadResponse, status_code=status.HTTP_202_ACCEPTED)
+async def upload_document(response: Response, file: UploadFile = File(...), x_admin_key: str = Header(...)):
+    """
+    Sube un PDF y lo procesa en segundo plano
+    
+    Retorna enseguida un `job_id`; el progreso se consulta en GET /upload/{job_id}.
+    El documento se usa en el chat recién cuando la carga termina.
+    
+    Si el mismo PDF ya está cargado responde 200 con `status: duplicate` y el
+    documento existente; si se está cargando, retorna la carga en curso.
     
     Requiere header: `x-admin-key` con la clave de admin
     """
     
     # Validar autenticación
-    if x_admin_key != settings.ADMIN_API_KEY:
+    verificar_admin(x_admin_key)
+    
+    if await file.read(5) != b"%PDF-":
         raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Clave de admin inválida"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El archivo no es un PDF"
         )
+    await file.seek(0)
     
+    path = None
     try:
-        inicio = time.time()
+        path, content_hash = await run_in_threadpool(guardar_temporal, file.file)
         
-        # Leer y procesar PDF
-        stream = file.file.read()
-        pdf_doc = fitz.open(stream=stream, filetype="pdf")
-        text = "".join(page.get_text() for page in pdf_doc)
+        existing = await get_document_by_hash(content_hash)
+        if existing:
+            os.remove(path)
+            response.status_code = status.HTTP_200_OK
+            return {
+                "job_id": None,
+                "document_id": existing["document_id"],
+                "file_name": existing["file_name"],
+                "status": "duplicate",
+                "mensaje": "El documento ya estaba cargado"
+            }
         
-        # Generar ID
-        document_id = str(uuid4())
-        file_name = unquote(file.filename)
+        # Cargas de este PDF que murieron con su worker: se cierran y se reintenta
+        for stale_path in await fail_stale_ingestion_jobs(content_hash):
+            if stale_path != path:
+                try:
+                    os.remove(stale_path)
+                except OSError:
+                    pass
         
-        # Guardar documento
-        db.documents.insert_one({
-            "document_id": document_id,
-            "file_name": file_name,
-            "content": text,
-            "uploaded_at": datetime.utcnow()
-        })
+        active = await get_active_ingestion_job(content_hash)
+        if active:
+            os.remove(path)
+            return {
+                "job_id": active["_id"],
+                "document_id": active["document_id"],
+                "file_name": active["file_name"],
+                "status": active["status"],
+                "mensaje": "El documento ya se está procesando"
+            }
         
-        # Guardar saludo inicial
-        save_message(document_id, "assistant", SALUDO_INICIAL)
+        job_id = uuid4().hex
+        document_id = str(uuid4())
+        file_name = unquote(file.filename)
         
-        tiempo = round(time.time() - inicio, 2)
+        job = await start_ingestion(job_id, document_id, file_name, path, content_hash)
         
         return {
+            "job_id": job_id,
             "document_id": document_id,
             "file_name": file_name,
-            "mensaje": "Documento cargado exitosamente"
+            "status": job["status"],
+            "mensaje": "Documento recibido, procesando en segundo plano"
         }
     
     except Exception as e:
+        if path:
+            os.remove(path)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error al procesar el PDF: {str(e)}"
         )
 
+@router.get("/upload/{job_id}", response_model=IngestionJob)
+async def upload_status(job_id: str, x_admin_key: str = Header(...)):
+    """
+    Estado de la carga de un PDF: páginas procesadas, fragmentos guardados y errores
+    
+    Requiere header: `x-admin-key` con la clave de admin
+    """
+    verificar_admin(x_admin_key)
+    
+    job = await get_ingestion_job(job_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Carga no encontrada"
+        )
+    return {"job_id": job.pop("_id"), **job}
+
+@router.post("/session", response_model=SessionResponse, status_code=status.HTTP_201_CREATED)
+async def create_session():
+    """Crea una conversación nueva y guarda el saludo inicial en su historial"""
+    session_id = uuid4().hex
+    await save_message(session_id, "assistant", SALUDO_INICIAL)
+    return {"session_id": session_id, "saludo": SALUDO_INICIAL}
+
+async def preparar_consulta(message: str, session_id: str) -> tuple:
+    """
+    Prepara la consulta al modelo. Retorna (messages, cache_key, cached, usage):
+    - cached: respuesta de la caché si la hay (messages y usage son None en ese caso)
+    - cache_key: None si la sesión ya tiene conversación, porque la respuesta depende de ella
+    - usage: tokens del prompt por sección
+    """
+    corpus = await get_corpus_index()
+    
+    if not len(corpus):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No hay documentos cargados"
+        )
+    
+    # Historial reciente de la sesión
+    history = await get_history(session_id, limit=settings.CHAT_HISTORY_LIMIT)
+    
+    cache_key = None
+    if not any(m["role"] == "user" for m in history):
+        cache_key = answer_cache.key(message, current_corpus_version())
+        cached = await answer_cache.get(cache_key)
+        if cached is not None:
+            return None, cache_key, cached, None
+    
+    # Solo los fragmentos más relevantes; cada sección dentro de su presupuesto de tokens
+    hits = corpus.search(message, settings.CHAT_TOP_K)
+    messages, usage = ensamblar_prompt(PROMPT_INICIAL, hits, history, message)
+    return messages, cache_key, None, usage
+
+def registrar_uso(usage: dict, provider_usage=None):
+    """Imprime los tokens estimados por sección y los que reporta OpenAI"""
+    linea = (
+        f"> Prompt: {usage['total']} tokens (sistema {usage['system']}, "
+        f"historial {usage['history']}/{usage['history_messages']} msj, "
+        f"contexto {usage['context']}/{usage['context_chunks']} frag, "
+        f"pregunta {usage['question']}){' recortado' if usage['trimmed'] else ''}"
+    )
+    if provider_usage is not None:
+        details = getattr(provider_usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", None) or 0
+        linea += f" | OpenAI: {provider_usage.prompt_tokens} prompt, {cached} en caché"
+    print(linea)
+
 @router.post("/chat", response_model=ChatResponse)
 async def chat(req: ChatRequest):
     """
-    Envía un mensaje - busca la respuesta en TODOS los PDFs cargados
+    Envía un mensaje - usa los fragmentos de los PDFs más relevantes para la pregunta
     """
     
     try:
-        inicio = time.time()
-        
-        # ✅ Busca TODOS los documentos
-        all_docs = list(db.documents.find({}, {"content": 1}))
+        session_id = req.session_id or uuid4().hex
+        messages, cache_key, answer, usage = await preparar_consulta(req.message, session_id)
         
-        if not all_docs:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="No hay documentos cargados"
+        if answer is None:
+            # Generar respuesta con OpenAI
+            response = await client.chat.completions.create(
+                model=settings.OPENAI_MODEL,
+                messages=messages,
+                temperature=0.7,
+                max_tokens=1000
             )
+            
+            answer = limpiar_respuesta(response.choices[0].message.content)
+            registrar_uso(usage, response.usage)
+            
+            if cache_key:
+                await answer_cache.set(cache_key, answer)
         
-        # ✅ Concatena todo el contenido de todos los PDFs
-        context_text = "\n\n---NUEVO DOCUMENTO---\n\n".join([d["content"] for d in all_docs])
+        await save_turn(session_id, req.message, answer)
         
-        # Historial con ID genérico para chat global
-        history = get_history("global_chat")
-        formatted_history = "\n".join(f"{m['role']}: {m['content']}" for m in history)
+        return {"respuesta": answer, "session_id": session_id, "uso_tokens": usage}
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error en el chat: {str(e)}"
+        )
+
+@router.get("/cache/stats")
+async def cache_stats(x_admin_key: str = Header(...)):
+    """
+    Aciertos y fallos de la caché de respuestas de este worker
+    
+    Requiere header: `x-admin-key` con la clave de admin
+    """
+    verificar_admin(x_admin_key)
+    return answer_cache.stats()
 
-        prompt = f"""
-{PROMPT_INICIAL}
+def evento_sse(data: dict, event: str = None) -> str:
+    """Formatea un evento Server-Sent Events"""
+    linea_evento = f"event: {event}\n" if event else ""
+    return f"{linea_evento}data: {json.dumps(data, ensure_ascii=False)}\n\n"
 
-INFORMACION DE REFERENCIA DISPONIBLE:
-{context_text}
+# Guardados de turnos en curso (referencia para que no los recolecte el GC)
+_guardados = set()
 
-HISTORIAL DE CONVERSACION:
-{formatted_history}
+async def _guardar_turno(session_id: str, message: str, answer: str):
+    try:
+        await save_turn(session_id, message, answer)
+    except Exception as e:
+        print(f"X Error al guardar el turno de {session_id}: {e}")
 
-PREGUNTA/COMENTARIO DEL USUARIO:
-{req.message}
+async def guardar_turno(session_id: str, message: str, answer: str):
+    """
+    Guarda el turno en una tarea protegida: si el cliente se desconecta,
+    Starlette cancela el stream pero el guardado termina igual.
+    """
+    task = asyncio.ensure_future(_guardar_turno(session_id, message, answer))
+    _guardados.add(task)
+    task.add_done_callback(_guardados.discard)
+    await asyncio.shield(task)
 
-Responde de forma natural, empática y conversacional. Usa la información disponible para ayudar, pero no menciones que viene de "documentos".
-"""
+async def generar_stream(message: str, session_id: str, messages: list, cache_key: str = None, cached: str = None, usage: dict = None):
+    """
+    Reenvía los tokens de OpenAI como eventos SSE y guarda la respuesta al terminar.
+    Si el stream se corta antes (desconexión o error de OpenAI) se guarda lo
+    generado hasta ese momento; solo la respuesta completa entra a la caché.
+    """
+    limpiador = LimpiadorIncremental()
+    partes = []
+    guardado = False
+    
+    try:
+        if cached is not None:
+            guardado = True
+            await guardar_turno(session_id, message, cached)
+            yield evento_sse({"delta": cached})
+            yield evento_sse({"respuesta": cached, "session_id": session_id, "uso_tokens": None}, event="done")
+            return
         
-        # Generar respuesta con OpenAI
-        response = client.chat.completions.create(
+        stream = await client.chat.completions.create(
             model=settings.OPENAI_MODEL,
-            messages=[
-                {"role": "system", "content": PROMPT_INICIAL},
-                {"role": "user", "content": f"{context_text}\n\n{formatted_history}\n\nPregunta: {req.message}"}
-            ],
+            messages=messages,
             temperature=0.7,
-            max_tokens=1000
+            max_tokens=1000,
+            stream=True,
+            stream_options={"include_usage": True}
         )
         
-        answer = limpiar_respuesta(response.choices[0].message.content)
+        provider_usage = None
+        async for chunk in stream:
+            # El último fragmento trae el uso de tokens y no tiene choices
+            if chunk.usage is not None:
+                provider_usage = chunk.usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            texto = limpiador.agregar(delta)
+            if texto:
+                partes.append(texto)
+                yield evento_sse({"delta": texto})
         
-        # Guardar en historial global
-        save_message("global_chat", "user", req.message)
-        save_message("global_chat", "assistant", answer)
+        answer = "".join(partes)
+        registrar_uso(usage, provider_usage)
         
-        tiempo = round(time.time() - inicio, 2)
+        guardado = True
+        await guardar_turno(session_id, message, answer)
+        if cache_key:
+            await answer_cache.set(cache_key, answer)
         
-        return {"respuesta": answer}
+        yield evento_sse({"respuesta": answer, "session_id": session_id, "uso_tokens": usage}, event="done")
+    
+    except Exception as e:
+        yield evento_sse({"detail": f"Error en el chat: {str(e)}"}, event="error")
+    
+    finally:
+        if not guardado and partes:
+            await guardar_turno(session_id, message, "".join(partes))
+
+@router.post("/chat/stream")
+async def chat_stream(req: ChatRequest):
+    """
+    Igual que /chat, pero envía la respuesta token a token como Server-Sent Events.
+    
+    Eventos: `data: {"delta": ...}` por cada fragmento, `event: done` con la respuesta
+    completa, el `session_id` y `uso_tokens` al terminar, o `event: error` si falla la generación.
+    """
     
+    try:
+        session_id = req.session_id or uuid4().hex
+        messages, cache_key, cached, usage = await preparar_consulta(req.message, session_id)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error en el chat: {str(e)}"
-        )
\ No newline at end of file
+        )
+    
+    return StreamingResponse(
+        generar_stream(req.message, session_id, messages, cache_key, cached, usage),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Session-Id": session_id}
+    )
@@ -1,20 +1,182 @@
 # ARCHIVO: secure-report-back/app/routers/media.py
 
-from fastapi import APIRouter, File, UploadFile, HTTPException, status
+from fastapi import APIRouter, File, UploadFile, HTTPException, Request, status
+from starlette.concurrency import run_in_threadpool
+from starlette.formparsers import MultiPartParser
 from typing import List
-import cloudinary
-import cloudinary.uploader
+import asyncio
+import hashlib
+import io
+import os
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
 from app.core.config import settings
+from app.core.images import normalize_image
+from app.core.limits import ByteBudget
+from app.core.security import hash_owner_token, verify_owner_token
+from app.core.storage import FOLDER, get_storage
+from app.core.workers import run_in_pool
+from app.db.mongo_async import (
+    get_media_by_hash, save_media_hash, get_report_by_id, create_upload_grant,
+    get_upload_grant, finish_upload_grant, add_report_media
+)
+from app.models.media import UploadGrantRequest, UploadGrant, UploadGrantStatus
 
 router = APIRouter()
 
-# Configurar Cloudinary
-cloudinary.config(
-    cloud_name=settings.CLOUDINARY_CLOUD_NAME,
-    api_key=settings.CLOUDINARY_API_KEY,
-    api_secret=settings.CLOUDINARY_API_SECRET,
-    secure=True
-)
+# Cloudinary o disco local, según MEDIA_STORAGE_BACKEND
+storage = get_storage()
+
+# Los archivos subidos quedan en memoria hasta este tamaño y luego pasan a disco.
+# Es un atributo de clase, así que también aplica a la subida de PDFs del chat:
+# solo cambia el umbral del SpooledTemporaryFile (no es un límite de tamaño; el
+# valor por defecto, 1 MB, es el mismo de Starlette) y guardar_temporal copia el
+# PDF a disco de todos modos
+MultiPartParser.max_file_size = settings.MEDIA_SPOOL_MAX_MEMORY
+
+# Bytes que este worker está subiendo a la vez
+upload_budget = ByteBudget(settings.MEDIA_WORKER_MAX_INFLIGHT_BYTES)
+
+# Subidas simultáneas al almacenamiento, entre todas las solicitudes del worker
+upload_slots = asyncio.Semaphore(settings.MEDIA_UPLOAD_CONCURRENCY)
+
+ALLOWED_TYPES = {
+    # Imágenes
+    "image/jpeg", "image/jpg", "image/png", "image/gif", "image/webp",
+    # Videos
+    "video/mp4", "video/quicktime", "video/x-msvideo", "video/x-ms-wmv"
+}
+
+# Formatos aceptados en la subida directa
+DIRECT_FORMATS = {
+    "image": ["jpg", "jpeg", "png", "gif", "webp"],
+    "video": ["mp4", "mov", "avi", "wmv"]
+}
+
+DIRECT_PREFIX = f"{FOLDER}/direct_"
+
+# Imágenes que se normalizan antes de subir (los GIF se suben tal cual para no perder la animación)
+NORMALIZED_TYPES = {"image/jpeg", "image/jpg", "image/png", "image/webp"}
+
+
+def file_size(file: UploadFile) -> int:
+    """Tamaño del archivo subido sin leerlo"""
+    if file.size is not None:
+        return file.size
+    file.file.seek(0, os.SEEK_END)
+    size = file.file.tell()
+    file.file.seek(0)
+    return size
+
+
+def hash_archivo(file: UploadFile) -> str:
+    """SHA-256 del archivo subido, leído por bloques"""
+    sha256 = hashlib.sha256()
+    file.file.seek(0)
+    while True:
+        bloque = file.file.read(1024 * 1024)
+        if not bloque:
+            break
+        sha256.update(bloque)
+    file.file.seek(0)
+    return sha256.hexdigest()
+
+
+def leer_archivo(file: UploadFile) -> bytes:
+    file.file.seek(0)
+    return file.file.read()
+
+
+async def preparar_archivo(file: UploadFile, size: int) -> tuple:
+    """
+    Retorna (archivo, nombre, bytes) listo para subir. Las imágenes se
+    decodifican y se vuelven a codificar sin metadatos en el pool de procesos;
+    para eso se leen completas (decodificarlas lo requiere igual). Los videos
+    se suben desde el archivo temporal sin leerlos.
+    """
+    if not settings.MEDIA_IMAGE_NORMALIZE or file.content_type not in NORMALIZED_TYPES:
+        return file.file, file.filename, size
+    
+    data = await run_in_threadpool(leer_archivo, file)
+    normalized = await run_in_pool(
+        "images",
+        normalize_image,
+        data,
+        settings.MEDIA_IMAGE_MAX_DIMENSION,
+        settings.MEDIA_IMAGE_FORMAT.upper(),
+        settings.MEDIA_IMAGE_QUALITY
+    )
+    stem = os.path.splitext(file.filename or "imagen")[0]
+    return io.BytesIO(normalized["data"]), f"{stem}.{normalized['format']}", len(normalized["data"])
+
+
+async def procesar_y_subir(file: UploadFile, size: int, resource_type: str) -> dict:
+    """
+    Normaliza (si es imagen) y sube; agrega el tamaño original y los bytes
+    ahorrados. Si el mismo archivo ya se subió (mismo SHA-256, p. ej. un
+    reintento desde el celular) retorna el existente sin volver a subirlo.
+    """
+    content_hash = await run_in_threadpool(hash_archivo, file)
+    existing = await get_media_by_hash(content_hash, settings.MEDIA_STORAGE_BACKEND)
+    if existing:
+        return {
+            "url": existing["url"],
+            "public_id": existing["public_id"],
+            "format": existing["format"],
+            "bytes": existing["bytes"],
+            "original_size": size,
+            "bytes_saved": 0,
+            "bytes_deduplicated": size,
+            "deduplicated": True
+        }
+    
+    fileobj, filename, sent = await preparar_archivo(file, size)
+    upload_result = await subir_archivo(fileobj, filename, resource_type)
+    await save_media_hash(content_hash, settings.MEDIA_STORAGE_BACKEND, resource_type, upload_result)
+    if sent != size:
+        print(f"> {file.filename}: {size} -> {sent} bytes")
+    return {
+        **upload_result,
+        "original_size": size,
+        "bytes_saved": max(0, size - sent),
+        "bytes_deduplicated": 0,
+        "deduplicated": False
+    }
+
+
+async def subir_archivo(fileobj, filename: str, resource_type: str) -> dict:
+    """
+    Sube un archivo al almacenamiento en un hilo, sin bloquear el event loop.
+    Espera un lugar entre las MEDIA_UPLOAD_CONCURRENCY subidas simultáneas y
+    reintenta los errores transitorios con backoff exponencial.
+    """
+    intentos = settings.MEDIA_UPLOAD_RETRIES + 1
+    for intento in range(intentos):
+        try:
+            async with upload_slots:
+                return await run_in_threadpool(
+                    storage.upload,
+                    fileobj,
+                    filename,
+                    resource_type,
+                    settings.MEDIA_UPLOAD_PART_TIMEOUT_SECONDS
+                )
+        except Exception as e:
+            if intento + 1 >= intentos or not storage.is_retryable(e):
+                raise
+            espera = settings.MEDIA_UPLOAD_BACKOFF_SECONDS * 2 ** intento
+            print(f"X Subida de {filename} falló ({e}), reintento en {espera}s")
+            await asyncio.sleep(espera)
+
+
+def reservar_bytes(size: int):
+    """Reserva el presupuesto del worker o responde 503"""
+    if not upload_budget.try_acquire(size):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="El servidor está procesando demasiados archivos, intenta de nuevo en unos segundos",
+            headers={"Retry-After": "5"}
+        )
 
 
 @router.post("/upload", status_code=status.HTTP_201_CREATED)
@@ -22,59 +184,64 @@ async def upload_media(file: UploadFile = File(...)):
     """
     Sube una imagen o video a Cloudinary y retorna la URL
     
+    Las imágenes (salvo GIF) se guardan sin metadatos (EXIF/GPS), con el lado
+    mayor limitado y recomprimidas; `bytes_saved` indica cuánto se redujo.
+    
     - **file**: Archivo de imagen (jpg, png, gif) o video (mp4, mov, avi)
     """
     
     # Validar tipo de archivo
-    allowed_types = {
-        # Imágenes
-        "image/jpeg", "image/jpg", "image/png", "image/gif", "image/webp",
-        # Videos
-        "video/mp4", "video/quicktime", "video/x-msvideo", "video/x-ms-wmv"
-    }
-    
-    if file.content_type not in allowed_types:
+    if file.content_type not in ALLOWED_TYPES:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Tipo de archivo no permitido. Tipos válidos: imágenes (jpg, png, gif, webp) o videos (mp4, mov, avi, wmv)"
         )
     
+    size = file_size(file)
+    if size > settings.MEDIA_MAX_FILE_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"El archivo supera el máximo de {settings.MEDIA_MAX_FILE_BYTES // (1024 * 1024)} MB"
+        )
+    
+    reservar_bytes(size)
     try:
         # Determinar el tipo de recurso
         resource_type = "video" if file.content_type.startswith("video/") else "image"
         
-        # Leer el archivo
-        contents = await file.read()
-        
-        # Subir a Cloudinary
-        upload_result = cloudinary.uploader.upload(
-            contents,
-            resource_type=resource_type,
-            folder="secure-report",  # Carpeta en Cloudinary
-            use_filename=True,
-            unique_filename=True
-        )
+        upload_result = await procesar_y_subir(file, size, resource_type)
         
         return {
             "success": True,
             "type": resource_type,
-            "url": upload_result["secure_url"],
+            "url": upload_result["url"],
             "public_id": upload_result["public_id"],
             "format": upload_result["format"],
-            "size": upload_result["bytes"]
+            "size": upload_result["bytes"],
+            "original_size": upload_result["original_size"],
+            "bytes_saved": upload_result["bytes_saved"],
+            "bytes_deduplicated": upload_result["bytes_deduplicated"],
+            "deduplicated": upload_result["deduplicated"]
         }
     
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error al subir el archivo: {str(e)}"
         )
+    finally:
+        upload_budget.release(size)
 
 
 @router.post("/upload/multiple", status_code=status.HTTP_201_CREATED)
 async def upload_multiple_media(files: List[UploadFile] = File(...)):
     """
-    Sube múltiples imágenes o videos a Cloudinary
+    Sube múltiples imágenes o videos a Cloudinary, varios a la vez
     
     - **files**: Lista de archivos (máximo 10)
     """
@@ -88,52 +255,264 @@ async def upload_multiple_media(files: List[UploadFile] = File(...)):
     results = []
     errors = []
     
+    # Validar tipo y tamaño antes de subir
+    pending = []
     for file in files:
-        try:
-            # Validar tipo de archivo
-            allowed_types = {
-                "image/jpeg", "image/jpg", "image/png", "image/gif", "image/webp",
-                "video/mp4", "video/quicktime", "video/x-msvideo", "video/x-ms-wmv"
-            }
-            
-            if file.content_type not in allowed_types:
-                errors.append({
-                    "filename": file.filename,
-                    "error": "Tipo de archivo no permitido"
-                })
-                continue
-            
-            # Determinar el tipo de recurso
-            resource_type = "video" if file.content_type.startswith("video/") else "image"
-            
-            # Leer el archivo
-            contents = await file.read()
-            
-            # Subir a Cloudinary
-            upload_result = cloudinary.uploader.upload(
-                contents,
-                resource_type=resource_type,
-                folder="secure-report",
-                use_filename=True,
-                unique_filename=True
-            )
-            
-            results.append({
+        if file.content_type not in ALLOWED_TYPES:
+            errors.append({
                 "filename": file.filename,
-                "type": resource_type,
-                "url": upload_result["secure_url"]
+                "error": "Tipo de archivo no permitido"
             })
+            continue
         
-        except Exception as e:
+        size = file_size(file)
+        if size > settings.MEDIA_MAX_FILE_BYTES:
             errors.append({
                 "filename": file.filename,
-                "error": str(e)
+                "error": f"El archivo supera el máximo de {settings.MEDIA_MAX_FILE_BYTES // (1024 * 1024)} MB"
             })
+            continue
+        
+        pending.append((file, size))
+    
+    # Solicitudes sin Content-Length no pasan por el middleware
+    total = sum(size for _, size in pending)
+    if total > settings.MEDIA_MAX_REQUEST_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"La solicitud supera el máximo de {settings.MEDIA_MAX_REQUEST_BYTES // (1024 * 1024)} MB"
+        )
+    
+    async def subir(file: UploadFile, size: int):
+        # Determinar el tipo de recurso
+        resource_type = "video" if file.content_type.startswith("video/") else "image"
+        try:
+            upload_result = await procesar_y_subir(file, size, resource_type)
+            return {
+                "filename": file.filename,
+                "type": resource_type,
+                "url": upload_result["url"],
+                "size": upload_result["bytes"],
+                "bytes_saved": upload_result["bytes_saved"],
+                "bytes_deduplicated": upload_result["bytes_deduplicated"],
+                "deduplicated": upload_result["deduplicated"]
+            }, None
+        except Exception as e:
+            return None, {
+                "filename": file.filename,
+                "error": str(e)
+            }
+    
+    reservar_bytes(total)
+    try:
+        # Todas a la vez, limitadas por upload_slots; el orden de la respuesta es el de los archivos
+        outcomes = await asyncio.gather(*(subir(file, size) for file, size in pending))
+    finally:
+        upload_budget.release(total)
+    
+    for result, error in outcomes:
+        if result:
+            results.append(result)
+        else:
+            errors.append(error)
     
     return {
         "success": len(errors) == 0,
         "uploaded": len(results),
         "failed": len(errors),
         "results": results,
-        "errors": errors if errors else None
+        "errors": errors if errors else None,
+        "bytes_saved": sum(result["bytes_saved"] for result in results),
+        "bytes_deduplicated": sum(result["bytes_deduplicated"] for result in results)
+    }
+
+
+@router.post("/upload/sign", response_model=UploadGrant, status_code=status.HTTP_201_CREATED)
+async def sign_direct_upload(request: UploadGrantRequest):
+    """
+    Permiso de corta duración para subir un archivo directo a Cloudinary, sin pasar por la API
+    
+    El cliente envía `file` y los `fields` retornados como multipart/form-data a
+    `upload_url`. Al terminar, Cloudinary avisa a POST /upload/callback, que
+    verifica tipo y tamaño y agrega el archivo al reporte indicado (si lo hay).
+    El estado se consulta en GET /upload/grants/{grant_id}.
+    """
+    
+    if not settings.MEDIA_CALLBACK_URL:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="La subida directa no está configurada"
+        )
+    
+    max_bytes = min(request.max_bytes or settings.MEDIA_MAX_FILE_BYTES, settings.MEDIA_MAX_FILE_BYTES)
+    
+    try:
+        if request.report_id:
+            # Los IDs de reporte son públicos: solo quien tiene el secreto del
+            # dueño (entregado al crear el reporte) puede agregarle archivos
+            if not request.ownerToken:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="ownerToken es obligatorio para subir a un reporte"
+                )
+            report = await get_report_by_id(request.report_id)
+            if not report or not verify_owner_token(request.ownerToken, report.get("ownerTokenHash")):
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Reporte no encontrado"
+                )
+        
+        grant_id = uuid4().hex
+        public_id = f"{DIRECT_PREFIX}{grant_id}"
+        signed = storage.sign_upload(
+            public_id,
+            request.resource_type,
+            DIRECT_FORMATS[request.resource_type],
+            settings.MEDIA_CALLBACK_URL
+        )
+        
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=settings.MEDIA_DIRECT_UPLOAD_TTL_SECONDS)
+        await create_upload_grant({
+            "_id": grant_id,
+            "public_id": public_id,
+            "resource_type": request.resource_type,
+            "max_bytes": max_bytes,
+            "report_id": request.report_id,
+            "owner_token_hash": hash_owner_token(request.ownerToken) if request.report_id else None,
+            "status": "pending",
+            "asset": None,
+            "error": None,
+            "created_at": now,
+            "expires_at": expires_at
+        })
+        
+        return {
+            "grant_id": grant_id,
+            "public_id": public_id,
+            "resource_type": request.resource_type,
+            "max_bytes": max_bytes,
+            "expires_at": expires_at,
+            **signed
+        }
+    
+    except HTTPException:
+        raise
+    except NotImplementedError:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="El almacenamiento configurado no permite subida directa"
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al firmar la subida: {str(e)}"
+        )
+
+
+def _subido_en(notification: dict) -> datetime:
+    """Fecha de subida del aviso (UTC sin zona, como las de MongoDB)"""
+    created_at = notification.get("created_at")
+    if not created_at:
+        return datetime.utcnow()
+    parsed = datetime.fromisoformat(created_at.replace("Z", "+00:00"))
+    return parsed.astimezone(timezone.utc).replace(tzinfo=None) if parsed.tzinfo else parsed
+
+
+@router.post("/upload/callback")
+async def direct_upload_callback(request: Request):
+    """
+    Aviso de Cloudinary cuando termina una subida directa (notification_url firmado)
+    
+    Responde 200 también cuando rechaza el archivo, para que Cloudinary no reintente.
+    """
+    body = await request.body()
+    
+    try:
+        notification = storage.parse_callback(
+            body,
+            request.headers,
+            max_age=settings.MEDIA_DIRECT_UPLOAD_TTL_SECONDS + 3600
+        )
+    except NotImplementedError:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="El almacenamiento configurado no permite subida directa"
+        )
+    except (ValueError, KeyError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=f"Aviso inválido: {str(e)}"
+        )
+    
+    public_id = notification["public_id"]
+    if not public_id.startswith(DIRECT_PREFIX):
+        return {"status": "ignored"}
+    
+    try:
+        grant = await get_upload_grant(public_id[len(DIRECT_PREFIX):])
+        
+        error = None
+        if not grant:
+            error = "Permiso de subida inexistente"
+        elif notification["resource_type"] != grant["resource_type"]:
+            error = f"Se esperaba un archivo de tipo {grant['resource_type']}"
+        elif notification["bytes"] > grant["max_bytes"]:
+            error = f"El archivo supera el máximo de {grant['max_bytes']} bytes"
+        elif _subido_en(notification) > grant["expires_at"]:
+            error = "El permiso de subida venció"
+        
+        if error:
+            # Los avisos repetidos de un permiso ya cerrado no vuelven a borrar
+            first = grant is None or await finish_upload_grant(grant["_id"], "rejected", error=error) is not None
+            if first:
+                await run_in_threadpool(storage.delete, public_id, notification["resource_type"])
+            print(f"X Subida directa rechazada ({public_id}): {error}")
+            return {"status": "rejected", "error": error}
+        
+        asset = {
+            "type": notification["resource_type"],
+            "url": notification["url"],
+            "public_id": public_id,
+            "format": notification["format"],
+            "size": notification["bytes"]
+        }
+        updated = await finish_upload_grant(grant["_id"], "completed", asset=asset)
+        if not updated:
+            # Aviso repetido: el permiso ya se cerró antes
+            return {"status": grant["status"]}
+        if updated.get("report_id"):
+            attached = await add_report_media(
+                updated["report_id"],
+                updated.get("owner_token_hash"),
+                {"type": asset["type"], "url": asset["url"]}
+            )
+            if not attached:
+                print(f"X Subida directa {public_id}: el reporte {updated['report_id']} no acepta el secreto del permiso")
+        
+        return {"status": "completed"}
+    
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al registrar la subida: {str(e)}"
+        )
+
+
+@router.get("/upload/grants/{grant_id}", response_model=UploadGrantStatus)
+async def get_direct_upload(grant_id: str):
+    """Estado de una subida directa y, al completarse, la URL del archivo"""
+    grant = await get_upload_grant(grant_id)
+    if not grant:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Permiso de subida no encontrado"
+        )
+    return {
+        "grant_id": grant["_id"],
+        "status": grant["status"],
+        "report_id": grant.get("report_id"),
+        "expires_at": grant["expires_at"],
+        "asset": grant.get("asset"),
+        "error": grant.get("error")
     }
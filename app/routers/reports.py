@@ -1,38 +1,106 @@
 # ARCHIVO: secure-report-back/app/routers/reports.py
 
-from fastapi import APIRouter, HTTPException, status
-from typing import List
-from pydantic import BaseModel
-from app.models.report import ReportCreate, ReportResponse, ReportStatus
-from app.db.mongo import create_report, get_reports_by_user, get_all_reports, update_report_status
-from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
+from typing import List, Literal, Optional
+import csv
+import io
+import json
+import time
+from pydantic import BaseModel, ValidationError
+from app.models.report import (
+    ReportCreate, ReportCreated, ReportResponse, ReportStatus, ReportCategory, ReportPage,
+    ReportNearPage, PolygonGeometry, ReportStats, Heatmap, ReportBulkCreate, ReportBulkResponse,
+    ReportBulkStatusUpdate, ReportBulkStatusResponse, ReportStatusHistory
+)
+from app.core.config import settings
+from app.core.security import get_current_admin, new_owner_token
+from app.db.mongo_async import (
+    create_report, create_reports_bulk, get_reports_by_user, get_all_reports, update_report_status, get_report_by_id,
+    build_report_filter, get_reports_near, get_reports_within, get_report_stats,
+    get_report_heatmap, iter_reports, update_reports_status, get_report_status_history
+)
+from app.db.stats import summarize_buckets
+from app.core.geohash import decode_center, precision_for_zoom
+from datetime import date, datetime, timedelta, timezone
 
 router = APIRouter()
 
 
-@router.post("/", response_model=ReportResponse, status_code=status.HTTP_201_CREATED)
-async def create_new_report(request: ReportCreate):
-    """Crea un nuevo reporte"""
+def _to_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Normaliza fechas con zona horaria a UTC sin tzinfo (como se guardan en MongoDB)"""
+    if value and value.tzinfo:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def report_filters(
+    statuses: Optional[List[ReportStatus]] = Query(None, alias="status", description="Se puede repetir"),
+    categories: Optional[List[ReportCategory]] = Query(None, alias="category", description="Se puede repetir"),
+    anonymous_user_id: Optional[str] = Query(None, alias="anonymousUserId"),
+    created_from: Optional[datetime] = Query(None, alias="createdFrom", description="createdAt >= createdFrom"),
+    created_to: Optional[datetime] = Query(None, alias="createdTo", description="createdAt < createdTo"),
+    updated_from: Optional[datetime] = Query(None, alias="updatedFrom", description="updatedAt >= updatedFrom"),
+    updated_to: Optional[datetime] = Query(None, alias="updatedTo", description="updatedAt < updatedTo")
+) -> dict:
+    """Filtros comunes de los listados de reportes, traducidos a una consulta de MongoDB"""
+    created_from, created_to = _to_utc(created_from), _to_utc(created_to)
+    updated_from, updated_to = _to_utc(updated_from), _to_utc(updated_to)
+
+    for start, end in ((created_from, created_to), (updated_from, updated_to)):
+        if start and end and start >= end:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Rango de fechas inválido: el inicio debe ser anterior al fin"
+            )
+
+    return build_report_filter(
+        statuses=[s.value for s in statuses] if statuses else None,
+        categories=[c.value for c in categories] if categories else None,
+        anonymous_user_id=anonymous_user_id,
+        created_from=created_from,
+        created_to=created_to,
+        updated_from=updated_from,
+        updated_to=updated_to
+    )
+
+
+def report_create_args(request: ReportCreate) -> dict:
+    """Argumentos de create_report a partir del request validado"""
+    return {
+        "anonymous_user_id": request.anonymousUserId,
+        "category": request.category.value,
+        "description": request.description,
+        "location": request.location.model_dump(),
+        "address_reference": request.addressReference,
+        "media": [m.model_dump() for m in request.media] if request.media else [],
+        "client_key": request.clientKey
+    }
+
+
+@router.post("/", response_model=ReportCreated, status_code=status.HTTP_201_CREATED)
+async def create_new_report(request: ReportCreate, response: Response):
+    """
+    Crea un nuevo reporte
+
+    La respuesta incluye `ownerToken`, el secreto para agregar archivos al
+    reporte después (POST /api/media/upload/sign). Solo se entrega aquí.
+
+    Con `clientKey`, reenviar el mismo reporte (reintento sin conexión) retorna
+    el ya creado con 200 en vez de crear otro (sin `ownerToken`).
+    """
     
     try:
-        report_id = create_report(
-            anonymous_user_id=request.anonymousUserId,
-            category=request.category,
-            description=request.description,
-            location=request.location.model_dump(),
-            address_reference=request.addressReference,
-            media=[m.model_dump() for m in request.media] if request.media else []
+        owner_token, owner_token_hash = new_owner_token()
+        report, created = await create_report(
+            **report_create_args(request),
+            owner_token_hash=owner_token_hash
         )
         
-        report = get_report_by_id(report_id)
-        
-        if not report:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Error al recuperar el reporte creado"
-            )
+        if not created:
+            response.status_code = status.HTTP_200_OK
         
-        return format_report_response(report)
+        return {**format_report_response(report), "ownerToken": owner_token if created else None}
     
     except Exception as e:
         raise HTTPException(
@@ -41,14 +109,99 @@ async def create_new_report(request: ReportCreate):
         )
 
 
-@router.get("/user/{anonymous_user_id}", response_model=List[ReportResponse])
-async def list_user_reports(anonymous_user_id: str):
-    """Lista todos los reportes de un usuario anónimo"""
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in e['loc']) or 'reporte'}: {e['msg']}" for e in error.errors()
+    )
+
+
+@router.post("/bulk", response_model=ReportBulkResponse)
+async def create_reports_in_bulk(request: ReportBulkCreate):
+    """
+    Crea varios reportes en una sola solicitud (cola offline de la app).
+
+    Cada elemento se valida por separado y se insertan todos los válidos con
+    un solo insert_many. El resultado de cada elemento viene en `results`, en
+    el mismo orden: `created`, `duplicate` (su `clientKey` ya se había usado;
+    se retorna el reporte existente), `invalid` o `failed`.
+    """
+    
+    if len(request.reports) > settings.REPORTS_BULK_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Máximo {settings.REPORTS_BULK_MAX_ITEMS} reportes por solicitud"
+        )
+    
+    results = [None] * len(request.reports)
+    to_create = []
+    owner_tokens = []
+    positions = []
+    
+    for index, item in enumerate(request.reports):
+        client_key = item.get("clientKey") if isinstance(item, dict) else None
+        if not isinstance(client_key, str):
+            client_key = None
+        try:
+            report = ReportCreate.model_validate(item)
+        except ValidationError as e:
+            results[index] = {
+                "index": index,
+                "clientKey": client_key,
+                "status": "invalid",
+                "error": _validation_message(e)
+            }
+            continue
+        owner_token, owner_token_hash = new_owner_token()
+        to_create.append({**report_create_args(report), "owner_token_hash": owner_token_hash})
+        owner_tokens.append(owner_token)
+        positions.append(index)
     
     try:
-        reports = get_reports_by_user(anonymous_user_id)
-        return [format_report_response(report) for report in reports]
+        inserted = await create_reports_bulk(to_create) if to_create else []
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al crear los reportes: {str(e)}"
+        )
+    
+    for index, args, owner_token, (outcome, report, error) in zip(positions, to_create, owner_tokens, inserted):
+        results[index] = {
+            "index": index,
+            "clientKey": args["client_key"],
+            "status": outcome,
+            "report": format_report_response(report) if report else None,
+            "ownerToken": owner_token if outcome == "created" else None,
+            "error": error
+        }
     
+    return {
+        "created": sum(1 for r in results if r["status"] == "created"),
+        "duplicates": sum(1 for r in results if r["status"] == "duplicate"),
+        "failed": sum(1 for r in results if r["status"] in ("invalid", "failed")),
+        "results": results
+    }
+
+
+@router.get("/user/{anonymous_user_id}", response_model=ReportPage)
+async def list_user_reports(
+    anonymous_user_id: str,
+    cursor: Optional[str] = Query(None, description="Cursor de la página anterior (next_cursor)"),
+    limit: int = Query(settings.REPORTS_PAGE_SIZE, ge=1, le=settings.REPORTS_MAX_PAGE_SIZE)
+):
+    """Lista los reportes de un usuario anónimo, paginados por cursor"""
+    
+    try:
+        reports, next_cursor = await get_reports_by_user(anonymous_user_id, cursor=cursor, limit=limit)
+        return {
+            "items": [format_report_response(report) for report in reports],
+            "next_cursor": next_cursor
+        }
+    
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -72,13 +225,25 @@ def format_report_response(report: dict) -> dict:
     }
 
 
-@router.get("/", response_model=List[ReportResponse])
-async def list_all_reports():
-    """Lista todos los reportes sin filtro"""
+@router.get("/", response_model=ReportPage)
+async def list_all_reports(
+    query: dict = Depends(report_filters),
+    cursor: Optional[str] = Query(None, description="Cursor de la página anterior (next_cursor)"),
+    limit: int = Query(settings.REPORTS_PAGE_SIZE, ge=1, le=settings.REPORTS_MAX_PAGE_SIZE)
+):
+    """Lista los reportes, con filtros opcionales y paginados por cursor"""
     try:
-        reports = get_all_reports()
-        return [format_report_response(report) for report in reports]
+        reports, next_cursor = await get_all_reports(query, cursor=cursor, limit=limit)
+        return {
+            "items": [format_report_response(report) for report in reports],
+            "next_cursor": next_cursor
+        }
 
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -86,18 +251,391 @@ async def list_all_reports():
         )
 
 
+def bbox_to_polygon(bbox: str) -> dict:
+    """Convierte 'minLng,minLat,maxLng,maxLat' en un polígono GeoJSON"""
+    try:
+        min_lng, min_lat, max_lng, max_lat = (float(v) for v in bbox.split(","))
+    except ValueError:
+        raise ValueError("bbox debe tener el formato minLng,minLat,maxLng,maxLat")
+
+    if not (-180 <= min_lng < max_lng <= 180 and -90 <= min_lat < max_lat <= 90):
+        raise ValueError("bbox fuera de rango o con límites invertidos")
+    if max_lng - min_lng >= 180:
+        raise ValueError("bbox no puede abarcar 180 grados de longitud o más")
+
+    return {
+        "type": "Polygon",
+        "coordinates": [[
+            [min_lng, min_lat],
+            [max_lng, min_lat],
+            [max_lng, max_lat],
+            [min_lng, max_lat],
+            [min_lng, min_lat]
+        ]]
+    }
+
+
+@router.get("/near", response_model=ReportNearPage)
+async def list_reports_near(
+    lng: float = Query(..., ge=-180, le=180, description="Longitud del centro"),
+    lat: float = Query(..., ge=-90, le=90, description="Latitud del centro"),
+    radius: float = Query(1000, gt=0, le=settings.REPORTS_NEAR_MAX_RADIUS_M, description="Radio en metros"),
+    query: dict = Depends(report_filters),
+    cursor: Optional[str] = Query(None, description="Cursor de la página anterior (next_cursor)"),
+    limit: int = Query(settings.REPORTS_PAGE_SIZE, ge=1, le=settings.REPORTS_MAX_PAGE_SIZE)
+):
+    """Lista reportes cercanos a un punto, del más cercano al más lejano"""
+    try:
+        reports, next_cursor = await get_reports_near(
+            lng, lat, radius, query, cursor=cursor, limit=limit
+        )
+        return {
+            "items": [
+                {**format_report_response(report), "distance": report["distance"]}
+                for report in reports
+            ],
+            "next_cursor": next_cursor
+        }
+
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al obtener los reportes: {str(e)}"
+        )
+
+
+async def _list_reports_within(geometry: dict, query: dict, cursor, limit) -> dict:
+    reports, next_cursor = await get_reports_within(geometry, query, cursor=cursor, limit=limit)
+    return {
+        "items": [format_report_response(report) for report in reports],
+        "next_cursor": next_cursor
+    }
+
+
+@router.get("/within", response_model=ReportPage)
+async def list_reports_in_bbox(
+    bbox: str = Query(..., description="minLng,minLat,maxLng,maxLat"),
+    query: dict = Depends(report_filters),
+    cursor: Optional[str] = Query(None, description="Cursor de la página anterior (next_cursor)"),
+    limit: int = Query(settings.REPORTS_PAGE_SIZE, ge=1, le=settings.REPORTS_MAX_PAGE_SIZE)
+):
+    """Lista reportes dentro de un rectángulo (viewport del mapa)"""
+    try:
+        return await _list_reports_within(bbox_to_polygon(bbox), query, cursor, limit)
+
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al obtener los reportes: {str(e)}"
+        )
+
+
+@router.post("/within", response_model=ReportPage)
+async def list_reports_in_polygon(
+    polygon: PolygonGeometry,
+    query: dict = Depends(report_filters),
+    cursor: Optional[str] = Query(None, description="Cursor de la página anterior (next_cursor)"),
+    limit: int = Query(settings.REPORTS_PAGE_SIZE, ge=1, le=settings.REPORTS_MAX_PAGE_SIZE)
+):
+    """Lista reportes dentro de un polígono GeoJSON"""
+    try:
+        return await _list_reports_within(polygon.model_dump(), query, cursor, limit)
+
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al obtener los reportes: {str(e)}"
+        )
+
+
+@router.get("/stats", response_model=ReportStats)
+async def report_stats(
+    date_from: Optional[date] = Query(None, alias="from", description="Día inicial (inclusive)"),
+    date_to: Optional[date] = Query(None, alias="to", description="Día final (inclusive)"),
+    statuses: Optional[List[ReportStatus]] = Query(None, alias="status", description="Se puede repetir"),
+    categories: Optional[List[ReportCategory]] = Query(None, alias="category", description="Se puede repetir")
+):
+    """
+    Estadísticas de reportes por categoría, estado y día de creación.
+    Se leen de los rollups precalculados, no de la colección de reportes.
+    """
+    if date_from and date_to and date_from > date_to:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Rango de fechas inválido: el inicio debe ser anterior al fin"
+        )
+
+    try:
+        buckets = await get_report_stats(
+            date_from=datetime.combine(date_from, datetime.min.time()) if date_from else None,
+            date_to=datetime.combine(date_to + timedelta(days=1), datetime.min.time()) if date_to else None,
+            query=build_report_filter(
+                statuses=[s.value for s in statuses] if statuses else None,
+                categories=[c.value for c in categories] if categories else None
+            )
+        )
+        return summarize_buckets(buckets)
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al obtener las estadísticas: {str(e)}"
+        )
+
+
+@router.get("/heatmap", response_model=Heatmap)
+async def report_heatmap(
+    zoom: Optional[int] = Query(None, ge=0, le=20, description="Nivel de zoom del mapa"),
+    precision: Optional[int] = Query(None, ge=1, le=12, description="Precisión de geohash (si no se envía zoom)"),
+    bbox: Optional[str] = Query(None, description="minLng,minLat,maxLng,maxLat"),
+    query: dict = Depends(report_filters)
+):
+    """
+    Cantidad de reportes por celda geohash para mapas de calor.
+    La precisión se deriva del zoom, o se indica directamente.
+    """
+    if zoom is not None:
+        precision = precision_for_zoom(zoom)
+    elif precision is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Se requiere zoom o precision"
+        )
+    precision = min(precision, settings.REPORTS_GEOHASH_PRECISION)
+
+    try:
+        if bbox:
+            query = {**query, "location": {"$geoWithin": {"$geometry": bbox_to_polygon(bbox)}}}
+
+        cells = await get_report_heatmap(precision, query, settings.HEATMAP_MAX_CELLS)
+
+        result = []
+        for cell in cells:
+            lat, lng = decode_center(cell["_id"])
+            result.append({"cell": cell["_id"], "count": cell["count"], "lat": lat, "lng": lng})
+
+        return {"precision": precision, "cells": result}
+
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al obtener el mapa de calor: {str(e)}"
+        )
+
+
+EXPORT_COLUMNS = [
+    "_id", "anonymousUserId", "category", "status", "description", "lng", "lat",
+    "addressReference", "media", "createdAt", "updatedAt"
+]
+
+
+def _json_default(value):
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+
+def _export_ndjson_line(report: dict) -> str:
+    return json.dumps(format_report_response(report), default=_json_default, ensure_ascii=False) + "\n"
+
+
+# Una celda de texto que empieza con estos caracteres se ejecuta como fórmula al
+# abrir el CSV en una hoja de cálculo
+_CSV_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _csv_cell(value):
+    """Escapa texto ingresado por usuarios para que se muestre como texto"""
+    if isinstance(value, str) and value.startswith(_CSV_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _export_csv_row(report: dict) -> list:
+    coordinates = report.get("location", {}).get("coordinates", [None, None])
+    row = [
+        report["_id"],
+        report.get("anonymousUserId"),
+        report.get("category"),
+        report.get("status"),
+        report.get("description"),
+        coordinates[0],
+        coordinates[1],
+        report.get("addressReference"),
+        " ".join(m["url"] for m in report.get("media", [])),
+        report["createdAt"].isoformat(),
+        report["updatedAt"].isoformat()
+    ]
+    return [_csv_cell(value) for value in row]
+
+
+async def _stream_export(query: dict, export_format: str):
+    """
+    Genera el export directamente desde el cursor de MongoDB. El encabezado CSV
+    (o la primera línea NDJSON) se envía de inmediato; después se envía lo
+    acumulado cada REPORTS_EXPORT_FLUSH_BYTES o REPORTS_EXPORT_FLUSH_SECONDS.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    if export_format == "csv":
+        writer.writerow(EXPORT_COLUMNS)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    first = export_format != "csv"
+    last_flush = time.monotonic()
+
+    async for report in iter_reports(query, settings.REPORTS_EXPORT_BATCH_SIZE):
+        if export_format == "csv":
+            writer.writerow(_export_csv_row(report))
+        else:
+            buffer.write(_export_ndjson_line(report))
+
+        now = time.monotonic()
+        if (
+            first
+            or buffer.tell() >= settings.REPORTS_EXPORT_FLUSH_BYTES
+            or now - last_flush >= settings.REPORTS_EXPORT_FLUSH_SECONDS
+        ):
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            first = False
+            last_flush = now
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+@router.get("/export", dependencies=[Depends(get_current_admin)])
+async def export_reports(
+    export_format: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+    query: dict = Depends(report_filters)
+):
+    """
+    Exporta reportes en NDJSON o CSV como stream, con los mismos filtros del listado.
+    La memoria usada no depende de la cantidad de reportes exportados.
+    Requiere token de administrador.
+    """
+    media_type = "text/csv" if export_format == "csv" else "application/x-ndjson"
+    filename = f"reportes-{datetime.utcnow():%Y%m%d-%H%M%S}.{export_format}"
+
+    return StreamingResponse(
+        _stream_export(query, export_format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
 class StatusUpdate(BaseModel):
     status: ReportStatus
 
 
+@router.patch("/status", response_model=ReportBulkStatusResponse)
+async def change_reports_status(
+    payload: ReportBulkStatusUpdate,
+    user: dict = Depends(get_current_admin)
+):
+    """Cambia el estado de varios reportes en una sola escritura. Requiere token de administrador.
+
+    Cada cambio queda en el historial del reporte. `result` de cada elemento:
+    `updated`, `not_found` o `conflict` (otro moderador cambió el estado al
+    mismo tiempo; volver a consultar el reporte antes de reintentar).
+    """
+    if len(payload.updates) > settings.REPORTS_BULK_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Máximo {settings.REPORTS_BULK_MAX_ITEMS} cambios por solicitud"
+        )
+    report_ids = [update.reportId for update in payload.updates]
+    if len(set(report_ids)) != len(report_ids):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cada reporte puede aparecer una sola vez"
+        )
+
+    try:
+        results = await update_reports_status(
+            [(update.reportId, update.status.value) for update in payload.updates],
+            by=user["id"]
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al actualizar el estado de los reportes: {str(e)}"
+        )
+
+    items = [
+        {
+            "reportId": report_id,
+            "result": result,
+            "report": format_report_response(report) if report else None
+        }
+        for report_id, (result, report) in zip(report_ids, results)
+    ]
+    updated = sum(1 for item in items if item["result"] == "updated")
+    return {"updated": updated, "failed": len(items) - updated, "results": items}
+
+
+@router.get("/{report_id}/history", response_model=ReportStatusHistory, dependencies=[Depends(get_current_admin)])
+async def report_status_history(report_id: str):
+    """Historial de cambios de estado de un reporte (últimos REPORTS_STATUS_HISTORY_MAX). Requiere token de administrador"""
+    try:
+        report = await get_report_status_history(report_id)
+
+        if not report:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Reporte no encontrado"
+            )
+
+        return {
+            "reportId": report["_id"],
+            "status": report["status"],
+            "history": report.get("statusHistory", [])
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al obtener el historial del reporte: {str(e)}"
+        )
+
+
 @router.patch("/{report_id}/status", response_model=ReportResponse)
-async def change_report_status(report_id: str, payload: StatusUpdate):
-    """Cambia el estado de un reporte.
+async def change_report_status(
+    report_id: str,
+    payload: StatusUpdate,
+    user: dict = Depends(get_current_admin)
+):
+    """Cambia el estado de un reporte. Requiere token de administrador.
 
     Estados válidos: `pending`, `in_review`, `approved`, `rejected`, `resolved`
     """
     try:
-        updated = update_report_status(report_id, payload.status.value)
+        updated = await update_report_status(report_id, payload.status.value, by=user["id"])
 
         if not updated:
             raise HTTPException(
@@ -116,17 +654,11 @@ async def change_report_status(report_id: str, payload: StatusUpdate):
         )
 
 
-def get_report_by_id(report_id: str):
-    """Obtiene un reporte por ID - importado desde mongo.py"""
-    from app.db.mongo import get_report_by_id as mongo_get_report
-    return mongo_get_report(report_id)
-
-
 @router.get("/{report_id}", response_model=ReportResponse)
 async def retrieve_report(report_id: str):
     """Obtiene un reporte por su ID"""
     try:
-        report = get_report_by_id(report_id)
+        report = await get_report_by_id(report_id)
 
         if not report:
             raise HTTPException(
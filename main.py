@@ -1,6 +1,10 @@
+import asyncio
+import os
 from fastapi import FastAPI
+from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
+from app.core.limits import MaxBodySizeMiddleware
 from app.routers import auth, reports, media, chat
 
 app = FastAPI(
@@ -9,6 +13,15 @@ app = FastAPI(
     debug=settings.DEBUG
 )
 
+# Rechaza subidas demasiado grandes antes de leer el cuerpo. Se registra antes
+# que CORS (el último middleware agregado es el más externo) para que el 413
+# lleve los headers CORS y el frontend pueda leerlo
+app.add_middleware(
+    MaxBodySizeMiddleware,
+    max_bytes=settings.MEDIA_MAX_REQUEST_BYTES,
+    path_prefix="/api/media"
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -17,10 +30,35 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+_background_tasks = set()
+
+async def _build_indexes():
+    """Crea los índices registrados sin bloquear el arranque"""
+    from app.db.indexes import ensure_indexes
+    from app.db.mongo_async import db
+    try:
+        await ensure_indexes(db)
+    except Exception as e:
+        print(f"X ERROR al crear índices: {e}")
+
 @app.on_event("startup")
 async def startup():
     """Conecta a MongoDB al iniciar"""
     from app.db import mongo
+    task = asyncio.create_task(_build_indexes())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Cierra los pools de procesos e hilos y las conexiones a MongoDB"""
+    from app.db import mongo, mongo_async
+    from app.core.workers import shutdown_pool
+    from app.core.security import shutdown_bcrypt_pool
+    shutdown_pool()
+    shutdown_bcrypt_pool()
+    mongo_async.close_connection()
+    mongo.close_connection()
 
 @app.get("/api/health")
 async def health():
@@ -44,6 +82,11 @@ app.include_router(reports.router, prefix="/api/reports", tags=["Reports"])
 app.include_router(media.router, prefix="/api/media", tags=["Media"])
 app.include_router(chat.router, prefix="/api/chat", tags=["Chat"])
 
+# Archivos del almacenamiento local (MEDIA_STORAGE_BACKEND=local)
+if settings.MEDIA_STORAGE_BACKEND == "local":
+    os.makedirs(settings.MEDIA_LOCAL_DIR, exist_ok=True)
+    app.mount(settings.MEDIA_LOCAL_BASE_URL, StaticFiles(directory=settings.MEDIA_LOCAL_DIR), name="media")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=5000, reload=True)
\ No newline at end of file